@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+if __name__ == "__main__":
+    from page_render import PageRenderer, render_resolution
+else:
+    try:
+        from .page_render import PageRenderer, render_resolution
+    except ImportError:
+        from page_render import PageRenderer, render_resolution
+
+class BatchInference:
+    def __init__(self, model, image_processor, batch_size=8, threads=None, threshold=0.5, render_policy='fixed', resolution=300, keep_renders=None) -> None:
+        self.model = model
+        self.image_processor = image_processor
+        self.batch_size = batch_size
+        self.threshold = threshold
+        self.render_policy = render_policy
+        self.resolution = resolution
+        # the renders kept for the structure model until their extraction, the detection runs over whole documents before the first extraction
+        self.keep_renders = batch_size if keep_renders is None else keep_renders
+        if threads is not None:
+            import torch # the model stack is only imported with a model-based method
+            torch.set_num_threads(threads)
+
+    def run(self, images, page_coordinates=False):
+        """
+        Run the detection model on a list of images in batches. Images of different sizes are padded by the image processor.
+
+        Args:
+            images (list): The rendered pages or tables (pdfplumber PageImage).
+            page_coordinates (bool): Return the boxes in pdf points instead of pixels of the image.
+
+        Returns:
+            list: One detection per image with the scores, labels and boxes (in image coordinates) and the scale of the image.
+        """
+        import torch
+
+        detections = []
+        for i in range(0, len(images), self.batch_size):
+            batch = images[i:i+self.batch_size]
+            inputs = self.image_processor(images=[x.original for x in batch], return_tensors="pt")
+
+            with torch.inference_mode():
+                outputs = self.model(**inputs)
+
+            # convert outputs (bounding boxes and class logits) to Pascal VOC format (xmin, ymin, xmax, ymax)
+            if page_coordinates:
+                target_sizes = torch.tensor([(x.original.size[::-1][0]/x.scale, x.original.size[::-1][1]/x.scale) for x in batch])
+            else:
+                target_sizes = torch.tensor([x.original.size[::-1] for x in batch])
+            results = self.image_processor.post_process_object_detection(outputs, threshold=self.threshold, target_sizes=target_sizes)
+
+            for image, result in zip(batch, results):
+                detections.append({'scores': result['scores'].tolist(), 'labels': result['labels'].tolist(), 'boxes': result['boxes'].tolist(), 'scale': image.scale})
+
+        return detections
+
+    def detect(self, extractors, page_indices=None):
+        """
+        Detect the tables on the pages of the given table extractors. The pages of all documents are rendered and collected until a batch is full.
+        With the model-based layout detection, the renders of the first keep_renders pages (the next ones to be extracted) are kept until their extraction,
+        all others are released after the detection and rendered again by their extraction.
+        The detections are stored in the detections of each TableExtractor and are used by extractTables instead of running the model page by page.
+
+        Args:
+            extractors (list): The TableExtractor objects of the documents.
+            page_indices (list): The indices of the pages to detect per TableExtractor. Default is the pages, whose tables are not cached (see TableExtractor.uncachedPages).
+
+        Returns:
+            None
+        """
+        if page_indices is None:
+            page_indices = [te.uncachedPages() for te in extractors]
+
+        images = []
+        targets = []
+        kept = set()
+        for te, indices in zip(extractors, page_indices):
+            for page_index in indices:
+                page = te.pages[page_index]
+                renderer = PageRenderer.for_page(page)
+                if te.layout_method == 'model-based' and len(kept) < self.keep_renders:
+                    # the tables are cut out of the same image for the structure model -> rasterize the page only once with the full resolution
+                    renderer.render(resolution=te.resolution)
+                    kept.add((id(te), page_index))
+                images.append(renderer.render(resolution=render_resolution(page, self.image_processor, self.render_policy, self.resolution)))
+                targets.append((te, page_index))
+
+                if len(images) == self.batch_size:
+                    self.store(images, targets, kept)
+                    images, targets = [], []
+
+        if len(images) > 0:
+            self.store(images, targets, kept)
+
+    def store(self, images, targets, kept=()):
+        """
+        Run a batch and map the detections back to their TableExtractor and page. The renders of all pages except the kept ones are released.
+        """
+        for (te, page_index), detection in zip(targets, self.run(images)):
+            te.detections[page_index] = detection
+            # don't keep the images of whole documents in memory until their extraction, only the few pages the structure model needs next (released by releasePage)
+            if (id(te), page_index) not in kept:
+                PageRenderer.release(te.pages[page_index])
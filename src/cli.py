@@ -4,7 +4,10 @@ import os
 import concurrent.futures
 
 from table_extractor import TableExtractor
-from transformers import AutoImageProcessor, TableTransformerForObjectDetection
+from batch_inference import BatchInference
+from result_cache import ResultCache
+from profiler import save_report
+from models import load_model, DETECTION_MODEL, STRUCTURE_MODEL, OPTIMIZATIONS
 
 def getPdfPaths(path):
     pdfs = []
@@ -14,12 +17,61 @@ def getPdfPaths(path):
                 pdfs.append(os.path.join(root, file))
     return pdfs
 
-def run(file, model, image_processor, structure_model, structure_image_processor, args):
+# models of a worker process, loaded once by initWorker
+worker_models = (None, None, None, None)
+
+def loadModels(args):
+    """
+    Load the detection and structure recognition models that are needed for the chosen methods. Rule-based runs never import torch or transformers.
+    """
+    if args.detection_method in ['model-based', 'hybrid']:
+        model, image_processor = load_model(DETECTION_MODEL, args.optimize, args.model_cache)
+    else:
+        model = None
+        image_processor = None
+
+    if args.layout_method == 'model-based':
+        structure_model, structure_image_processor = load_model(STRUCTURE_MODEL, args.optimize, args.model_cache)
+    else:
+        structure_model = None
+        structure_image_processor = None
+
+    return model, image_processor, structure_model, structure_image_processor
+
+def initWorker(args, threads):
+    """
+    Load the models once per worker process and limit the torch threads, so that the workers do not oversubscribe the cores.
+    """
+    import torch # only the model-based workers need torch
+
+    global worker_models
+    torch.set_num_threads(threads)
+    worker_models = loadModels(args)
+
+def runWorker(file, args):
+    model, image_processor, structure_model, structure_image_processor = worker_models
+    te = createExtractor(file, model, image_processor, structure_model, structure_image_processor, args)
+    if args.detection_method == 'model-based' and (args.img_path is not None or te.cachedTables() is None):
+        # with images, the cached pages are extracted again
+        BatchInference(model, image_processor, batch_size=args.batch_size, render_policy=args.render_policy, resolution=args.resolution).detect([te], None if args.img_path is None else [range(len(te.pages))])
+    return run(file, model, image_processor, structure_model, structure_image_processor, args, te=te)
+
+def createExtractor(file, model, image_processor, structure_model, structure_image_processor, args):
+    return TableExtractor(path=file, separate_units=False, detection_method=args.detection_method, layout_method=args.layout_method, model=model, image_processor=image_processor, layout_model=structure_model, layout_processor=structure_image_processor, max_column_space=args.max_charspace, max_row_space=args.max_linespace, render_policy=args.render_policy, resolution=args.resolution, max_memory=args.max_memory, structure_batch_size=args.batch_size, structure_scope=args.structure_scope, profile=args.profile is not None, cache=ResultCache(args.cache_dir, args.cache_size) if args.cache_dir is not None else None)
+
+def run(file, model, image_processor, structure_model, structure_image_processor, args, te=None):
     print(file)
-    te = TableExtractor(path=file, separate_units=False, detection_method=args.detection_method, layout_method=args.layout_method, model=model, image_processor=image_processor, layout_model=structure_model, layout_processor=structure_image_processor, max_column_space=args.max_charspace, max_row_space=args.max_linespace)
-    tables = te.extractTables(img_path=args.img_path, overwrite=args.overwrite)
+    if te is None: te = createExtractor(file, model, image_processor, structure_model, structure_image_processor, args)
+    # export every table as soon as its page is done and close the pdf afterwards
+    with te:
+        for i, table in enumerate(te.iter_tables(img_path=args.img_path, overwrite=args.overwrite, workers=args.page_workers)):
+            with te.profile.stage('export'):
+                te.export(args.export_format, f'{args.export}/{file.replace("/", "_")[:-4]}_{i}', table=table, overwrite=args.overwrite)
 
-    for i, table in enumerate(tables): te.export(args.export_format, f'{args.export}/{file.replace("/", "_")[:-4]}_{i}', table=table, overwrite=args.overwrite)
+    if args.detection_method == 'hybrid':
+        # pages loaded from the cache were not searched and are not counted
+        print(f"{file}: {sum(te.escalations.values())} of {len(te.escalations)} extracted pages passed to the detection model")
+    return te.profile.report(), te.escalations
  
 if __name__ == "__main__":
     # create parser
@@ -27,7 +79,7 @@ if __name__ == "__main__":
     
     # add arguments to the parser
     parser.add_argument("path", help="Path to pdf file or directory containing pdf files")
-    parser.add_argument("--detection_method", choices=["rule-based", "model-based"], default="rule-based", help="Choose if the table detection should be a rule-based approach or with microsofts table extraction. Default is rule-based.")
+    parser.add_argument("--detection_method", choices=["rule-based", "model-based", "hybrid"], default="rule-based", help="Choose if the table detection should be a rule-based approach or with microsofts table extraction. The hybrid detection is rule-based and passes only uncertain pages to the model. Default is rule-based.")
     parser.add_argument("--layout_method", choices=["rule-based", "model-based"], default="rule-based", help="Choose if the table layout detection should be a rule-based approach or with microsofts table extraction. Default is rule-based.")
     parser.add_argument("--max_linespace", type=float, help="Choose a maximum for the line space until considered a new row. Default is -0.3", default=-0.3)
     parser.add_argument("--max_charspace", type=float, help="Choose a maximum for the space between characters until considered a new column. Default is 5", default=5)
@@ -35,36 +87,62 @@ if __name__ == "__main__":
     parser.add_argument("--overwrite", action="store_true", help="Overwrite existing images that have the same filename", default=False)
     parser.add_argument("--export", help="Directory for table(s) to be saved to.", default="tables")
     parser.add_argument("--export_format", choices=["csv", "json", "excel"], help="Export the table", default="csv")
-    parser.add_argument("--workers", type=int, help="Number of processes to use. Default is 1. Existing files will be overwritten, with more than one workers.", default=1)
+    parser.add_argument("--workers", type=int, help="Number of processes to use. Default is 1. Existing files will be overwritten, with more than one workers. With a model-based method, every worker loads the models once.", default=1)
+    parser.add_argument("--batch_size", type=int, help="Number of pages that are passed to the detection model at once with the model-based detection, and number of tables that are passed to the structure model at once with the model-based layout detection. Default is 8.", default=8)
+    parser.add_argument("--structure_scope", choices=["page", "document"], default="page", help="Batch the structure recognition of the model-based layout detection over the tables of a page or of the whole pdf. Default is page.")
+    parser.add_argument("--render_policy", choices=["fixed", "model"], default="fixed", help="Render the pages for the models with a fixed resolution or directly at the input size of the models (at most the given resolution). Default is fixed.")
+    parser.add_argument("--resolution", type=int, help="Resolution of the rendered pages and images in dpi. Default is 300.", default=300)
+    parser.add_argument("--page_workers", type=int, help="Number of processes the pages of a single pdf file are distributed to. Default is 1. Existing images will be overwritten, with more than one page workers.", default=1)
+    parser.add_argument("--max_memory", type=float, help="Memory budget of a process in MB. If the resident memory exceeds it after a page, the pdf is closed and all parsed pages are freed. Default is no budget.", default=None)
+    parser.add_argument("--cache_dir", "--cache-dir", help="Directory of the result cache. The tables of pdf files, that were already extracted with the same settings, are loaded from the cache. Default is no cache.", default=None)
+    parser.add_argument("--cache_size", type=float, help="Maximum size of the result cache in MB. The least recently used results are deleted first. Default is 1024.", default=1024)
+    parser.add_argument("--profile", help="Path of a json or csv report with the time, number of calls and counters of every extraction stage per page. Default is no profiling.", default=None)
+    parser.add_argument("--threads", type=int, help="Number of threads torch uses for the model inference. Default is the torch default, or the number of cores divided by the number of workers.", default=None)
+    parser.add_argument("--optimize", choices=OPTIMIZATIONS, help="Use a CPU-optimized variant of the models: int8 dynamic quantization of the linear layers and/or a traced, frozen graph. Default is the original model.", default=None)
+    parser.add_argument("--model_cache", help="Directory of the optimized models, which are converted on the first use. Default is ~/.cache/fp.", default=None)
 
     # parse the arguments
     args = parser.parse_args()
     files = getPdfPaths(args.path) if os.path.isdir(args.path) else [args.path]
 
-    if args.detection_method == 'model-based':
-        image_processor = AutoImageProcessor.from_pretrained("microsoft/table-transformer-detection")
-        model = TableTransformerForObjectDetection.from_pretrained("microsoft/table-transformer-detection")
-    else:
-        model = None
-        image_processor = None
-
-    if args.layout_method == 'model-based':
-        structure_image_processor = AutoImageProcessor.from_pretrained("microsoft/table-transformer-structure-recognition")
-        structure_model = TableTransformerForObjectDetection.from_pretrained("microsoft/table-transformer-structure-recognition")
-    else:
-        structure_model = None
-        structure_image_processor = None
-
     if not os.path.exists(args.export): os.mkdir(args.export)
+    if args.page_workers > 1: args.overwrite = True
 
     all_rule = args.detection_method == 'rule-based' and args.layout_method == 'rule-based'
+    results = []
 
     if all_rule and args.workers > 1:
         args.overwrite = True
-        with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers if all_rule else 1, max_tasks_per_child=50 if all_rule else None) as executor:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers) as executor:
+
+            futures = [executor.submit(run, file, None, None, None, None, args) for file in files]
+            results = [future.result() for future in futures if future.exception() is None]
+    elif args.workers > 1:
+        # every worker loads the models once and keeps them for all of its files
+        args.overwrite = True
+        threads = args.threads if args.threads is not None else max(1, (os.cpu_count() or 1) // args.workers)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers, initializer=initWorker, initargs=(args, threads)) as executor:
 
-            for file in files:
-                executor.submit(run, file, model, image_processor, structure_model, structure_image_processor, args)
+            futures = [executor.submit(runWorker, file, args) for file in files]
+            results = [future.result() for future in futures if future.exception() is None]
     else:
-        for file in files:
-            run(file, model, image_processor, structure_model, structure_image_processor, args)
+        model, image_processor, structure_model, structure_image_processor = loadModels(args)
+
+        if args.detection_method == 'model-based':
+            # detect the tables of several documents at once in batches of pages
+            inference = BatchInference(model, image_processor, batch_size=args.batch_size, threads=args.threads, render_policy=args.render_policy, resolution=args.resolution)
+            for i in range(0, len(files), args.batch_size):
+                extractors = [createExtractor(file, model, image_processor, structure_model, structure_image_processor, args) for file in files[i:i+args.batch_size]]
+                # cached documents are not parsed at all and only the pages of changed documents, that are not cached, are detected
+                targets = [te for te in extractors if args.img_path is not None or te.cachedTables() is None]
+                inference.detect(targets, None if args.img_path is None else [range(len(te.pages)) for te in targets])
+                results.extend(run(te.path, model, image_processor, structure_model, structure_image_processor, args, te=te) for te in extractors)
+        else:
+            results = [run(file, model, image_processor, structure_model, structure_image_processor, args) for file in files]
+
+    profile = [row for rows, _ in results for row in rows]
+    if args.detection_method == 'hybrid':
+        escalations = [escalated for _, pages in results for escalated in pages.values()]
+        print(f"{sum(escalations)} of {len(escalations)} extracted pages passed to the detection model, {len(escalations) - sum(escalations)} stayed rule-based" + (" (pages loaded from the cache are not counted)" if args.cache_dir is not None else ""))
+
+    if args.profile is not None: save_report(profile, args.profile)
\ No newline at end of file
@@ -2,21 +2,30 @@
 import pdfplumber
 import numpy as np
 import re
-import torch
 
 if __name__ == "__main__":
     from table_finder import TableFinder
+    from page_index import PageIndex
+    from page_render import PageRenderer, render_resolution
+    from batch_inference import BatchInference
 else:
     try:
         from .table_finder import TableFinder
+        from .page_index import PageIndex
+        from .page_render import PageRenderer, render_resolution
+        from .batch_inference import BatchInference
     except ImportError:
         from table_finder import TableFinder
+        from page_index import PageIndex
+        from page_render import PageRenderer, render_resolution
+        from batch_inference import BatchInference
 
 
 class LayoutExtractor:
     def __init__(self, table, clipping, separate_units=False) -> None:
         self.table = table
         self.clipping = clipping
+        self.index = PageIndex.for_page(clipping)
         self.page_height = clipping.parent_page.height
         self.table_lines = sorted(self.table['lines'], key=lambda e: e['top'])
         self.separate_units = separate_units
@@ -43,7 +52,7 @@ class LayoutExtractor:
         bbox_above_row[0] = x-1
         bbox_above_row[2] = x+1
         bbox_above_row[3] = top
-        intersecting_chars = self.clipping.crop(bbox_above_row).chars
+        intersecting_chars = self.index.chars(bbox_above_row, parent_bbox=self.clipping.bbox)
 
         # get all ruling lines that are above the headerline and the bottom of the row
         t_lines = [t_line for t_line in self.table_lines if t_line['top'] < self.table['header']-2 and 
@@ -79,29 +88,34 @@ class LayoutExtractor:
         """
         chars = [char for char in sorted(clipping.chars, key=lambda e: e['x0']) if char['text']  not in special_symbols]
         separator = []
+        if len(chars) < 2:
+            return separator
 
-        for i in range(len(chars)-1):
-            char = chars[i]
-            next_char = chars[i+1]
-            diff = next_char['x0'] - char['x1']
+        x0 = np.array([x['x0'] for x in chars], dtype=float)
+        x1 = np.array([x['x1'] for x in chars], dtype=float)
+        fonts = {}
+        font = np.array([fonts.setdefault(x['fontname'], len(fonts)) for x in chars])
+        before = np.array([x['text'] in before_symbols for x in chars], dtype=bool)
+        after = np.array([x['text'] in after_symbols for x in chars], dtype=bool)
+        dash = np.array([x['text'] == '-' for x in chars], dtype=bool)
 
-            if (char['text'] in before_symbols and next_char['text'] not in before_symbols or
-                (next_char['text'] in after_symbols and char['text'] not in after_symbols) or
-                char['text'] == '-' or next_char['text'] == '-'):
-                continue
-
-            if (diff > max_diff or (font_diff and diff > 3 and next_char['fontname'] != char['fontname']) or
-                (diff > 1 and next_char['text'] in before_symbols and char['text'] not in before_symbols) or
-                (diff > 1 and char['text'] in after_symbols and next_char['text'] not in after_symbols)):
+        # compare every char with its right neighbour
+        diff = x0[1:] - x1[:-1]
+        skip = (before[:-1] & ~before[1:]) | (after[1:] & ~after[:-1]) | dash[:-1] | dash[1:]
+        split = ((diff > max_diff) | (font_diff & (diff > 3) & (font[1:] != font[:-1])) |
+                 ((diff > 1) & before[1:] & ~before[:-1]) |
+                 ((diff > 1) & after[:-1] & ~after[1:]))
+        separator_xs = x0[1:] - (diff/2)
 
-                separator_x = next_char['x0']-(diff/2)
+        for i in np.flatnonzero(split & ~skip):
+            separator_x = float(separator_xs[i])
 
-                bottom = clipping.bbox[3]
+            bottom = clipping.bbox[3]
 
-                # test table lines if they are above the headerline
-                top = self.extend_top_of_column(separator_x, clipping.bbox[1], clipping.bbox[3])
+            # test table lines if they are above the headerline
+            top = self.extend_top_of_column(separator_x, clipping.bbox[1], clipping.bbox[3])
 
-                separator.append({'x0': separator_x, 'top': top, 'x1': separator_x, 'bottom': bottom, 'object_type': 'line', 'height': bottom-top})
+            separator.append({'x0': separator_x, 'top': top, 'x1': separator_x, 'bottom': bottom, 'object_type': 'line', 'height': bottom-top})
 
         return separator
 
@@ -120,22 +134,26 @@ class LayoutExtractor:
         chars = [char for char in sorted(clipping.chars, key=lambda e: e['top']) if char['text'] not in [' ', '\n', '\t']]
         separator = []
         header_separator = None
-        i=0
-        while i < len(chars)-1:
-            diff = chars[i+1]['top'] - chars[i]['bottom']
-            avg = (chars[i]['bottom'] + chars[i+1]['top']) / 2
 
-            if diff > max_diff:
-                left = self.table['bbox'][0]
-                right = self.table['bbox'][2]
-                line = {'x0': left, 'top': avg, 'x1': right, 'bottom': avg, 'object_type': 'line', 'width': right-left}
-                separator.append(line)
+        top = np.array([x['top'] for x in chars], dtype=float)
+        bottom = np.array([x['bottom'] for x in chars], dtype=float)
+        fonts = {}
+        font = np.array([fonts.setdefault(x['fontname'], len(fonts)) for x in chars])
 
-                # separate header if font changes for the first time
-                if chars[i+1]['fontname'] != chars[i]['fontname'] and header_separator is None:
-                    header_separator = avg
+        # compare every char with the next one below
+        diff = top[1:] - bottom[:-1]
+        avg = (bottom[:-1] + top[1:]) / 2
+        split = diff > max_diff
 
-            i += 1
+        left = self.table['bbox'][0]
+        right = self.table['bbox'][2]
+        for a in avg[split].tolist():
+            separator.append({'x0': left, 'top': a, 'x1': right, 'bottom': a, 'object_type': 'line', 'width': right-left})
+
+        # separate header if font changes for the first time
+        font_change = np.flatnonzero(split & (font[1:] != font[:-1]))
+        if len(font_change) > 0:
+            header_separator = float(avg[font_change[0]])
 
         table_percentage = clipping.height/self.page_height
         if header_separator is None or header_separator - clipping.bbox[1] > clipping.height * (1-table_percentage)*0.9 > 1:
@@ -270,7 +288,7 @@ class LayoutExtractor:
                 continue
             bbox = [l1['x0'], max_top+1, l2['x1']-1, min_bottom]
             try: 
-                if len([x for x in self.clipping.crop(bbox).chars if x['text'] !=' ']) != 0:
+                if len([x for x in self.index.chars(bbox, parent_bbox=self.clipping.bbox) if x['text'] !=' ']) != 0:
                     i+=1
                     continue
             except:
@@ -353,38 +371,52 @@ class LayoutExtractor:
 
         return self.column_separator, self.row_separator
 
-    def find_model_layout(self, structure_model, structure_image_processor):
+    def structure_bbox(self):
+        """
+        Get the bounding box of the table with a margin of 20 points, that is passed to the structure recognition model.
+        """
+        table = self.table['bbox'].copy()
+        table[0]-=20 if table[0]-20 > self.clipping.parent_page.bbox[0] else self.clipping.parent_page.bbox[0]
+        table[2]+=20 if table[2]+20 < self.clipping.parent_page.bbox[2] else self.clipping.parent_page.bbox[2]
+        table[1]-=20 if table[1]-20 > self.clipping.parent_page.bbox[1] else self.clipping.parent_page.bbox[1]
+        table[3]+=20 if table[3]+20 < self.clipping.parent_page.bbox[3] else self.clipping.parent_page.bbox[3]
+        return table
+
+    def structure_image(self, structure_image_processor, render_policy='fixed', resolution=300):
+        """
+        Render the table with its margin for the structure recognition model.
+
+        Returns:
+            PageImage: The image of the table.
+        """
+        table_page = self.clipping.parent_page.crop(self.structure_bbox())
+        return PageRenderer.for_page(self.clipping).render(table_page, resolution=render_resolution(table_page, structure_image_processor, render_policy, resolution))
+
+    def find_model_layout(self, structure_model, structure_image_processor, render_policy='fixed', resolution=300, structure=None):
         """
         Find the layout of a table with microsofts table layout detection model.
 
         Args:
             structure_model: The model used to analyze the structure of the image.
             structure_image_processor: The image processor used to process the structure image.
+            render_policy (str): 'fixed' renders the table with the given resolution, 'model' at the input size of the model (see render_resolution).
+            resolution (int): The fixed or maximum resolution of the table image.
+            structure (dict): Precomputed detections of the structure model for this table (see TableExtractor.recognizeStructures). If provided, the model is not run again.
 
         Returns:
             column_separator: The separators for the columns in the detected table.
             row_separator: The separators for the rows in the detected table.
         """
-        table = self.table['bbox'].copy()
-        table[0]-=20 if table[0]-20 > self.clipping.parent_page.bbox[0] else self.clipping.parent_page.bbox[0]
-        table[2]+=20 if table[2]+20 < self.clipping.parent_page.bbox[2] else self.clipping.parent_page.bbox[2]
-        table[1]-=20 if table[1]-20 > self.clipping.parent_page.bbox[1] else self.clipping.parent_page.bbox[1]
-        table[3]+=20 if table[3]+20 < self.clipping.parent_page.bbox[3] else self.clipping.parent_page.bbox[3]
-        image = self.clipping.parent_page.crop(table).to_image(resolution=300)
-        
-        inputs = structure_image_processor(images=image.original, return_tensors="pt")
-        outputs = structure_model(**inputs)
-
-        # convert outputs (bounding boxes and class logits) to Pascal VOC format (xmin, ymin, xmax, ymax)
-        target_sizes = torch.tensor([(image.original.size[::-1][0]/image.scale, image.original.size[::-1][1]/image.scale)])
-        results = structure_image_processor.post_process_object_detection(outputs, threshold=0.7, target_sizes=target_sizes)[0]
+        if structure is None:
+            image = self.structure_image(structure_image_processor, render_policy, resolution)
+            structure = BatchInference(structure_model, structure_image_processor, batch_size=1, threshold=0.7).run([image], page_coordinates=True)[0]
 
+        table = self.structure_bbox()
         boxes = []
-        derived_tables = []
-        for score, label, box in zip(results["scores"], results["labels"], results["boxes"]):
-            bbox = [a+b for a, b in zip([table[0], table[1], table[0], table[1]], box.tolist())] # reorder and scale
+        for score, label, box in zip(structure["scores"], structure["labels"], structure["boxes"]):
+            bbox = [a+b for a, b in zip([table[0], table[1], table[0], table[1]], box)] # reorder and scale
             #bbox = self.extend_table(top_threshold=2, bottom_threshold=2, bbox=bbox)
-            boxes.append({'label': structure_model.config.id2label[label.item()], 'score': score.item(), 'bbox': bbox})
+            boxes.append({'label': structure_model.config.id2label[label], 'score': score, 'bbox': bbox})
         
         self.column_separator = [{'x0': x['bbox'][0], 'x1': x['bbox'][0], 'width': 0, 'height': x['bbox'][3] - x['bbox'][1], 'object_type': 'line', 'top': x['bbox'][1], 'bottom': x['bbox'][3]} for x in boxes if x['label'] in ['table column', 'table column header']] + \
                                 [{'x0': x['bbox'][2], 'x1': x['bbox'][2], 'width': 0, 'height': x['bbox'][3] - x['bbox'][1], 'object_type': 'line', 'top': x['bbox'][1], 'bottom': x['bbox'][3]} for x in boxes if x['label'] in ['table column', 'table column header']]
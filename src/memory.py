@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+import os
+import sys
+import resource
+
+def current_rss():
+    """
+    Get the resident set size of the current process.
+
+    Returns:
+        float: The resident memory in MB. Falls back to the peak resident memory on systems without /proc.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024**2
+    except (OSError, ValueError, IndexError):
+        return peak_rss()
+
+def peak_rss():
+    """
+    Get the peak resident set size of the current process.
+
+    Returns:
+        float: The peak resident memory in MB.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes on linux
+    return peak / 1024**2 if sys.platform == 'darwin' else peak / 1024
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+import os
+import hashlib
+from types import SimpleNamespace
+
+DETECTION_MODEL = "microsoft/table-transformer-detection"
+STRUCTURE_MODEL = "microsoft/table-transformer-structure-recognition"
+OPTIMIZATIONS = ['int8', 'torchscript', 'int8-torchscript']
+
+def load_model(name, optimize=None, cache_dir=None):
+    """
+    Load a table transformer and its image processor. transformers (and with it torch) is only imported here, so that rule-based runs do not pay for the import of the model stack.
+
+    Args:
+        name (str): The name of the model on the hugging face hub or a local directory.
+        optimize (str): A CPU-optimized variant of the model (see optimize_model). Default is the original model.
+        cache_dir (str): The directory of the converted models. Default is ~/.cache/fp.
+
+    Returns:
+        tuple: The model and the image processor.
+    """
+    from transformers import AutoImageProcessor, TableTransformerForObjectDetection
+
+    image_processor = AutoImageProcessor.from_pretrained(name)
+    if optimize is None:
+        return TableTransformerForObjectDetection.from_pretrained(name), image_processor
+    return optimize_model(name, optimize, cache_dir), image_processor
+
+def optimize_model(name, optimize, cache_dir=None):
+    """
+    Get a CPU-optimized variant of a table transformer. It is converted once and stored on disk, later calls load the converted model.
+    + int8: dynamic quantization of the linear layers to int8
+    + torchscript: traced and frozen graph
+    + int8-torchscript: traced and frozen graph of the quantized model
+
+    Args:
+        name (str): The name of the model on the hugging face hub or a local directory.
+        optimize (str): One of OPTIMIZATIONS.
+        cache_dir (str): The directory of the converted models. Default is ~/.cache/fp.
+
+    Returns:
+        The model. It is called like the original model and has its config.
+    """
+    import torch
+    import transformers
+    from transformers import AutoConfig, TableTransformerForObjectDetection
+
+    if optimize not in OPTIMIZATIONS:
+        raise ValueError(f"Unknown optimization {optimize}, choose one of {OPTIMIZATIONS}")
+
+    if cache_dir is None: cache_dir = os.path.join(os.path.expanduser('~'), '.cache', 'fp')
+    if not os.path.exists(cache_dir): os.makedirs(cache_dir)
+    # the converted models depend on the versions of torch and transformers
+    key = hashlib.sha256(repr((os.path.abspath(name) if os.path.isdir(name) else name, optimize, torch.__version__, transformers.__version__)).encode()).hexdigest()[:16]
+    file = os.path.join(cache_dir, f'{os.path.basename(name.rstrip("/"))}_{optimize}_{key}.pt')
+
+    config = AutoConfig.from_pretrained(name)
+    if os.path.exists(file):
+        if optimize == 'int8':
+            model = torch.load(file, weights_only=False)
+        else:
+            model = TracedModel(torch.jit.load(file), config)
+    else:
+        model = TableTransformerForObjectDetection.from_pretrained(name).eval()
+        if optimize in ['int8', 'int8-torchscript']:
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        if optimize in ['torchscript', 'int8-torchscript']:
+            with torch.no_grad():
+                # the traced graph does not depend on the image size, so any example input can be used
+                example = (torch.zeros(1, 3, 800, 800), torch.ones(1, 800, 800, dtype=torch.long))
+                graph = torch.jit.freeze(torch.jit.trace(trace_wrapper(model).eval(), example, strict=False, check_trace=False))
+            model = TracedModel(graph, config)
+
+        # write to a temporary file first, so that parallel workers never read a partial model
+        tmp = f'{file}.{os.getpid()}.tmp'
+        if optimize == 'int8': torch.save(model, tmp)
+        else: torch.jit.save(model.graph, tmp)
+        os.replace(tmp, file)
+
+    model.optimization = optimize
+    return model
+
+def trace_wrapper(model):
+    """
+    Wrap a table transformer in a module that returns only the tensors needed for the post processing, so that it can be traced.
+    """
+    import torch
+
+    class Wrapper(torch.nn.Module):
+        def __init__(self, model) -> None:
+            super().__init__()
+            self.model = model
+
+        def forward(self, pixel_values, pixel_mask):
+            outputs = self.model(pixel_values=pixel_values, pixel_mask=pixel_mask)
+            return outputs.logits, outputs.pred_boxes
+
+    return Wrapper(model)
+
+class TracedModel:
+    def __init__(self, graph, config) -> None:
+        """
+        A traced table transformer with the interface of the original model.
+
+        Args:
+            graph (torch.jit.ScriptModule): The traced and frozen graph.
+            config (PretrainedConfig): The config of the original model, e.g. for the labels.
+        """
+        self.graph = graph
+        self.config = config
+
+    def __call__(self, pixel_values, pixel_mask=None, **kwargs):
+        import torch
+
+        if pixel_mask is None:
+            pixel_mask = torch.ones((pixel_values.shape[0], *pixel_values.shape[2:]), dtype=torch.long)
+        logits, pred_boxes = self.graph(pixel_values, pixel_mask)
+        return SimpleNamespace(logits=logits, pred_boxes=pred_boxes)
+
+    def eval(self):
+        return self
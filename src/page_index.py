@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+import math
+import numpy as np
+from pdfplumber.utils import clip_obj, chars_to_textmap, extract_text
+from pdfplumber.page import test_proposed_bbox
+
+class CharTable:
+    def __init__(self, chars) -> None:
+        self.chars = sorted(chars, key=lambda e: e['x0'])
+        self.x0 = np.array([x['x0'] for x in self.chars], dtype=float)
+        self.x1 = np.array([x['x1'] for x in self.chars], dtype=float)
+        self.top = np.array([x['top'] for x in self.chars], dtype=float)
+        self.bottom = np.array([x['bottom'] for x in self.chars], dtype=float)
+        self.upright = np.array([x['matrix'][1] == 0 and x['matrix'][2] == 0 for x in self.chars], dtype=bool)
+        self.space = np.array([x['text'] == ' ' for x in self.chars], dtype=bool)
+        self.digit = np.array([x['text'].isdigit() for x in self.chars], dtype=bool)
+
+    def mask(self, bbox=None, upright=True, skip_spaces=True):
+        """
+        Get a mask of the chars that lie completely within a bounding box.
+
+        Args:
+            bbox (list): The bounding box in the format [x0, top, x1, bottom]. Use None for an unbounded side. Defaults to no restriction.
+            upright (bool): Only select chars that are not rotated or skewed.
+            skip_spaces (bool): Do not select white spaces.
+
+        Returns:
+            numpy.ndarray: A boolean mask over the chars of the table.
+        """
+        mask = np.ones(len(self.chars), dtype=bool)
+        if bbox is not None:
+            x0, top, x1, bottom = bbox
+            # the chars are sorted by x0 -> the left side can be found with binary search
+            if x0 is not None: mask[:np.searchsorted(self.x0, x0, side='left')] = False
+            if x1 is not None: mask &= self.x1 <= x1
+            if top is not None: mask &= self.top >= top
+            if bottom is not None: mask &= self.bottom <= bottom
+        if upright: mask &= self.upright
+        if skip_spaces: mask &= ~self.space
+        return mask
+
+    def select(self, mask):
+        """
+        Get the chars of a mask, sorted by x0.
+        """
+        return [self.chars[i] for i in np.flatnonzero(mask)]
+
+class StripProfile:
+    def __init__(self, objs, chars) -> None:
+        # summed height of the chars in the strip over the whole page
+        self.height = sum(x['height'] for x in chars)
+
+        top = np.array([x['top'] for x in objs], dtype=float)
+        bottom = np.array([x['bottom'] for x in objs], dtype=float)
+        width = np.array([x['x1'] - x['x0'] for x in objs], dtype=float)
+
+        # objects that only touch the strip need a height within the queried range, like in pdfplumber's get_bbox_overlap
+        wide = width > 0
+        thin = (width == 0) & (bottom > top)
+        self.tops = np.sort(top[wide])
+        self.bottoms = np.sort(bottom[wide])
+        self.thin_tops = np.sort(top[thin])
+        self.thin_bottoms = np.sort(bottom[thin])
+
+    def count(self, top, bottom):
+        """
+        Get the number of objects in the strip, that intersect with the range between top and bottom. Equal to the number of objects of a crop of the strip.
+        The objects are counted with the sorted tops and bottoms (cumulative counts), so the page is not searched again.
+
+        Args:
+            top (float): The top of the range, within the page.
+            bottom (float): The bottom of the range, within the page.
+
+        Returns:
+            int: The number of objects.
+        """
+        if top > bottom:
+            return 0
+        # all objects minus the ones below and the ones above the range
+        count = np.searchsorted(self.tops, bottom, side='right') - np.searchsorted(self.bottoms, top, side='left')
+        if top < bottom:
+            count += np.searchsorted(self.thin_tops, bottom, side='left') - np.searchsorted(self.thin_bottoms, top, side='right')
+        return int(count)
+
+class PageIndex:
+    def __init__(self, page, cell_size=20) -> None:
+        self.page = page
+        self.cell_size = cell_size
+        self.x_origin = page.bbox[0]
+        self.y_origin = page.bbox[1]
+        self.columns = max(1, math.ceil(page.width / cell_size))
+        self.rows = max(1, math.ceil(page.height / cell_size))
+        self.grids = {}
+        self.strips = {}
+        self._char_table = None
+
+    @classmethod
+    def for_page(cls, page):
+        """
+        Get the spatial index of a page. The index is built once for the root page and shared by every module, that works on the page or one of its clippings.
+
+        Args:
+            page (Page): The pdfplumber page or cropped page.
+
+        Returns:
+            PageIndex: The index of the root page.
+        """
+        root = page.root_page
+        if not hasattr(root, '_page_index'):
+            root._page_index = cls(root)
+        return root._page_index
+
+    @classmethod
+    def release(cls, page):
+        """
+        Drop the index of a page to free the memory.
+        """
+        root = page.root_page
+        if hasattr(root, '_page_index'):
+            del root._page_index
+
+    def bucket_range(self, start, end, origin, count):
+        """
+        Get the range of grid buckets that are covered by the interval [start, end]. Coordinates outside of the page are assigned to the border buckets.
+        """
+        first = min(max(math.floor((start - origin) / self.cell_size), 0), count-1)
+        last = min(max(math.floor((end - origin) / self.cell_size), 0), count-1)
+        return range(first, last+1)
+
+    def grid(self, kind):
+        """
+        Get the grid for an object type. The grid is (re)built if the object list of the page has changed since the last build, e.g. because the TableFinder added collapsed rects to the lines.
+
+        Args:
+            kind (str): The object type (char, line, rect, curve).
+
+        Returns:
+            tuple: The objects and a dictionary mapping grid buckets to object indices.
+        """
+        objs = self.page.objects.get(kind, [])
+        if kind in self.grids and self.grids[kind][0] is objs and self.grids[kind][1] == len(objs):
+            return objs, self.grids[kind][2]
+
+        buckets = {}
+        for i, obj in enumerate(objs):
+            for col in self.bucket_range(obj['x0'], obj['x1'], self.x_origin, self.columns):
+                for row in self.bucket_range(obj['top'], obj['bottom'], self.y_origin, self.rows):
+                    buckets.setdefault((col, row), []).append(i)
+
+        self.grids[kind] = (objs, len(objs), buckets)
+        return objs, buckets
+
+    def char_table(self):
+        """
+        Get the column-wise char table of the page. It is built on the first call.
+        """
+        if self._char_table is None:
+            self._char_table = CharTable(self.page.chars)
+        return self._char_table
+
+    def strip(self, x0, x1):
+        """
+        Get the occupancy profile of a vertical strip over the whole page height, e.g. the middle of the page to classify one- and two-column layouts. 
+        It is built on the first call and contains the chars, filled lines and rects of the strip.
+
+        Args:
+            x0 (float): The left side of the strip.
+            x1 (float): The right side of the strip.
+
+        Returns:
+            StripProfile: The profile of the strip.
+        """
+        if (x0, x1) not in self.strips:
+            objs = self.query([x0, self.page.bbox[1], x1, self.page.bbox[3]], kinds=('char', 'line', 'rect'), strict=False)
+            self.strips[(x0, x1)] = StripProfile(objs['char'] + [x for x in objs['line'] if x['fill'] == True] + objs['rect'], objs['char'])
+        return self.strips[(x0, x1)]
+
+    def refresh(self, kind=None):
+        """
+        Drop the grid of one or all object types, e.g. after their coordinates have been changed in place. The strip profiles are dropped as well.
+        """
+        if kind is None: self.grids = {}
+        else: self.grids.pop(kind, None)
+        self.strips = {}
+
+    def query(self, bbox, kinds=('char', 'line', 'rect', 'curve'), strict=True, parent_bbox=None):
+        """
+        Get the objects intersecting with a bounding box, clipped to the bounding box. The result is the same as page.crop(bbox).objects for the given kinds.
+
+        Args:
+            bbox (list): The bounding box in the format [x0, top, x1, bottom].
+            kinds (tuple): The object types to return.
+            strict (bool): Raise a ValueError like pdfplumber if the bbox is not fully within parent_bbox.
+            parent_bbox (list): The bbox of the (cropped) page the query is made for. Defaults to the page bbox.
+
+        Returns:
+            dict: The clipped objects for each kind, in the same order as on the page.
+        """
+        bbox = tuple(bbox)
+        if strict:
+            test_proposed_bbox(bbox, self.page.bbox if parent_bbox is None else parent_bbox)
+
+        result = {}
+        for kind in kinds:
+            result[kind] = list(filter(None, (clip_obj(obj, bbox) for obj in self.candidates(bbox, kind))))
+
+        return result
+
+    def candidates(self, bbox, kind='char'):
+        """
+        Get the unclipped objects of the grid buckets covered by a bounding box. This is a superset of the objects intersecting with the bounding box.
+
+        Returns:
+            list: The objects in the same order as on the page.
+        """
+        objs, buckets = self.grid(kind)
+        candidates = set()
+        for col in self.bucket_range(bbox[0], bbox[2], self.x_origin, self.columns):
+            for row in self.bucket_range(bbox[1], bbox[3], self.y_origin, self.rows):
+                candidates.update(buckets.get((col, row), ()))
+        return [objs[i] for i in sorted(candidates)]
+
+    def chars(self, bbox, strict=True, parent_bbox=None):
+        """
+        Shortcut for the chars within a bounding box, equal to page.crop(bbox).chars.
+        """
+        return self.query(bbox, kinds=('char',), strict=strict, parent_bbox=parent_bbox)['char']
+
+    def lines(self, bbox, strict=True, parent_bbox=None):
+        """
+        Shortcut for the lines within a bounding box, equal to page.crop(bbox).lines.
+        """
+        return self.query(bbox, kinds=('line',), strict=strict, parent_bbox=parent_bbox)['line']
+
+class CellBins:
+    def __init__(self, index, cells) -> None:
+        """
+        Bin the chars of a table into the blocks of its cell grid once, so that the chars of a cell do not have to be searched on the whole page again.
+
+        Args:
+            index (PageIndex): The index of the root page.
+            cells (list): The cells of the table in the format (x0, top, x1, bottom).
+        """
+        self.index = index
+        # the sorted row and column separators of the grid
+        self.xs = np.unique([x for cell in cells for x in (cell[0], cell[2])])
+        self.ys = np.unique([y for cell in cells for y in (cell[1], cell[3])])
+        self.objs = []
+        self.bins = {}
+        if len(self.xs) < 2 or len(self.ys) < 2:
+            return
+
+        self.objs = index.candidates([self.xs[0], self.ys[0], self.xs[-1], self.ys[-1]], 'char')
+        first_col, last_col = self.blocks(self.xs, [x['x0'] for x in self.objs], [x['x1'] for x in self.objs])
+        first_row, last_row = self.blocks(self.ys, [x['top'] for x in self.objs], [x['bottom'] for x in self.objs])
+        for i in range(len(self.objs)):
+            for col in range(first_col[i], last_col[i]+1):
+                for row in range(first_row[i], last_row[i]+1):
+                    self.bins.setdefault((col, row), []).append(i)
+
+    @staticmethod
+    def blocks(edges, start, end):
+        """
+        Get the first and last block between two consecutive edges, that is touched by the intervals [start, end]. Found with binary search on the sorted edges.
+        """
+        first = np.maximum(np.searchsorted(edges, start, side='left') - 1, 0)
+        last = np.minimum(np.searchsorted(edges, end, side='right') - 1, len(edges) - 2)
+        return first, last
+
+    def covers(self, bbox):
+        """
+        Check if a bounding box lies within the grid, i.e. all chars intersecting with it are binned.
+        """
+        return len(self.xs) >= 2 and len(self.ys) >= 2 and self.xs[0] <= bbox[0] and bbox[2] <= self.xs[-1] and self.ys[0] <= bbox[1] and bbox[3] <= self.ys[-1]
+
+    def candidates(self, bbox):
+        """
+        Get the unclipped chars of the blocks touched by a bounding box in the same order as on the page.
+        """
+        first_col, last_col = self.blocks(self.xs, bbox[0], bbox[2])
+        first_row, last_row = self.blocks(self.ys, bbox[1], bbox[3])
+        candidates = set()
+        for col in range(first_col, last_col+1):
+            for row in range(first_row, last_row+1):
+                candidates.update(self.bins.get((col, row), ()))
+        return [self.objs[i] for i in sorted(candidates)]
+
+    def chars(self, bbox, strict=True, parent_bbox=None):
+        """
+        Get the chars within a bounding box, equal to page.crop(bbox).chars. Bounding boxes outside of the grid are searched in the page index.
+        """
+        if not self.covers(bbox):
+            return self.index.chars(bbox, strict=strict, parent_bbox=parent_bbox)
+
+        bbox = tuple(bbox)
+        if strict:
+            test_proposed_bbox(bbox, self.index.page.bbox if parent_bbox is None else parent_bbox)
+        return list(filter(None, (clip_obj(obj, bbox) for obj in self.candidates(bbox))))
+
+    def text(self, page_crop, bbox):
+        """
+        Get the text within a bounding box of a crop of the root page, equal to page_crop.crop(bbox).extract_text().
+
+        Args:
+            page_crop (CroppedPage): The crop of the table.
+            bbox (list): The bounding box in the format [x0, top, x1, bottom].
+
+        Returns:
+            str: The text.
+        """
+        if not self.covers(bbox) or page_crop.parent_page is not self.index.page:
+            return page_crop.crop(bbox).extract_text()
+
+        test_proposed_bbox(bbox, page_crop.bbox)
+        # the chars of the table crop are clipped again to the bounding box, like in a nested crop
+        chars = [clip_obj(obj, page_crop.bbox) for obj in self.candidates(bbox)]
+        chars = list(filter(None, (clip_obj(obj, bbox) for obj in chars if obj is not None)))
+        return chars_to_textmap(chars, layout_bbox=bbox, layout_width=bbox[2]-bbox[0], layout_height=bbox[3]-bbox[1]).as_string
+
+class CellTexts:
+    def __init__(self, chars) -> None:
+        """
+        The texts of the cells of a pdfplumber table, equal to the ones of Table.extract(). The chars are assigned to a cell by their midpoint. 
+        They are sorted by their vertical midpoint once, so that the chars of a cell are found with binary search and every text is only extracted once.
+
+        Args:
+            chars (list): The chars of the (cropped) page of the table.
+        """
+        self.chars = chars
+        h_mid = np.array([(x['x0'] + x['x1']) / 2 for x in chars], dtype=float)
+        v_mid = np.array([(x['top'] + x['bottom']) / 2 for x in chars], dtype=float)
+        self.order = np.argsort(v_mid, kind='stable')
+        self.h_mid = h_mid[self.order]
+        self.v_mid = v_mid[self.order]
+        self.texts = {}
+
+    def text(self, cell):
+        """
+        Get the text of a cell.
+
+        Args:
+            cell (tuple): The cell in the format (x0, top, x1, bottom) or None.
+
+        Returns:
+            str: The text or None, if the cell is None.
+        """
+        if cell is None:
+            return None
+        if cell not in self.texts:
+            start = np.searchsorted(self.v_mid, cell[1], side='left')
+            end = np.searchsorted(self.v_mid, cell[3], side='left')
+            h_mid = self.h_mid[start:end]
+            idxs = np.sort(self.order[start:end][(h_mid >= cell[0]) & (h_mid < cell[2])])
+            self.texts[cell] = extract_text([self.chars[i] for i in idxs])
+        return self.texts[cell]
+
+    def row(self, row):
+        """
+        Get the texts of the cells of a row, equal to a row of Table.extract().
+        """
+        return [self.text(cell) for cell in row.cells]
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+from pdfplumber.display import PageImage
+
+def render_resolution(page, image_processor=None, render_policy='fixed', resolution=300):
+    """
+    Get the resolution a page (or a cropped table) is rendered with for one of the models.
+
+    Args:
+        page (Page): The page or cropped page that is passed to the model.
+        image_processor: The image processor of the model. Its target size is used with the 'model' policy.
+        render_policy (str): 'fixed' renders with the given resolution. 'model' renders directly at the input size of the model, but never above the given resolution.
+        resolution (int): The fixed resolution or the maximum resolution for the 'model' policy.
+
+    Returns:
+        float: The resolution in dpi.
+    """
+    if render_policy != 'model' or image_processor is None:
+        return resolution
+
+    size = image_processor.size
+    shortest_edge, longest_edge = size.get('shortest_edge'), size.get('longest_edge')
+    if shortest_edge is None and size.get('height') is not None:
+        shortest_edge, longest_edge = min(size.get('height'), size.get('width')), max(size.get('height'), size.get('width'))
+    if shortest_edge is None:
+        return resolution
+
+    # the processor resizes the shortest edge to shortest_edge, as long as the longest edge stays below longest_edge
+    scale = shortest_edge / min(page.width, page.height)
+    if longest_edge is not None:
+        scale = min(scale, longest_edge / max(page.width, page.height))
+
+    return min(resolution, 72 * scale)
+
+class PageRenderer:
+    def __init__(self, page) -> None:
+        self.page = page
+        self.resolution = None
+        self.original = None
+
+    @classmethod
+    def for_page(cls, page):
+        """
+        Get the render cache of a page. The cache is created once for the root page and shared by the detection, the layout detection and the debug images.
+
+        Args:
+            page (Page): The pdfplumber page or cropped page.
+
+        Returns:
+            PageRenderer: The render cache of the root page.
+        """
+        root = page.root_page
+        if not hasattr(root, '_page_renderer'):
+            root._page_renderer = cls(root)
+        return root._page_renderer
+
+    @classmethod
+    def release(cls, page):
+        """
+        Drop the rendered image of a page to free the memory.
+        """
+        root = page.root_page
+        if hasattr(root, '_page_renderer'):
+            del root._page_renderer
+
+    def render(self, page=None, resolution=300):
+        """
+        Get an image of the page or of a cropped part of it. The page is only rasterized, if no image with at least the requested resolution exists.
+        Lower resolutions are downscaled and cropped pages are cut out of the cached image.
+
+        Args:
+            page (Page): The page or cropped page to get the image of. Defaults to the whole page.
+            resolution (int): The resolution of the image.
+
+        Returns:
+            PageImage: A new image, that can be drawn on without changing the cache.
+        """
+        if page is None:
+            page = self.page
+
+        if self.original is None or self.resolution < resolution:
+            self.original = self.page.to_image(resolution=resolution).original
+            self.resolution = resolution
+
+        original = self.original
+        if resolution != self.resolution:
+            original = original.resize((round(original.size[0] * resolution / self.resolution), round(original.size[1] * resolution / self.resolution)))
+
+        return PageImage(page, original=original, resolution=resolution)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+import csv
+import json
+import time
+
+class Stage:
+    def __init__(self, profiler, name) -> None:
+        self.profiler = profiler
+        self.name = name
+        self.counters = {}
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.add(self.name, time.perf_counter() - self.start, self.counters)
+
+    def count(self, **counters):
+        """
+        Add counters (e.g. chars, lines, cells) to the stage.
+        """
+        for key, value in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+
+class NullStage:
+    """
+    Stage of a disabled profiler, that records nothing.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return None
+
+    def count(self, **counters):
+        return None
+
+NULL_STAGE = NullStage()
+
+class Profiler:
+    def __init__(self, enabled=False, file=None) -> None:
+        self.enabled = enabled
+        self.file = file
+        self.page = None # index of the page that is currently extracted
+        self.stages = {} # (page, stage) -> {'time', 'calls', counters...}
+
+    def stage(self, name):
+        """
+        Measure the wall time of a stage of the current page.
+
+        Args:
+            name (str): The name of the stage.
+
+        Returns:
+            Stage: A context manager. Counters can be added with its count method.
+        """
+        if not self.enabled:
+            return NULL_STAGE
+        return Stage(self, name)
+
+    def add(self, name, seconds, counters=None):
+        """
+        Add one call of a stage of the current page.
+        """
+        stats = self.stages.setdefault((self.page, name), {'time': 0.0, 'calls': 0})
+        stats['time'] += seconds
+        stats['calls'] += 1
+        for key, value in (counters or {}).items():
+            stats[key] = stats.get(key, 0) + value
+
+    def merge(self, rows):
+        """
+        Add the report rows of another profiler, e.g. of a worker process.
+        """
+        for row in rows:
+            stats = self.stages.setdefault((row['page'], row['stage']), {'time': 0.0, 'calls': 0})
+            for key, value in row.items():
+                if key not in ['file', 'page', 'stage']:
+                    stats[key] = stats.get(key, 0) + value
+
+    def report(self):
+        """
+        Get the recorded stages.
+
+        Returns:
+            list: One dictionary per page and stage with the file, page, stage, wall time in seconds, number of calls and the counters.
+        """
+        rows = [{'file': self.file, 'page': page, 'stage': stage, **stats} for (page, stage), stats in self.stages.items()]
+        return sorted(rows, key=lambda e: -1 if e['page'] is None else e['page'])
+
+def save_report(rows, path):
+    """
+    Save profiler report rows as csv or json, depending on the file extension.
+
+    Args:
+        rows (list): The rows of one or more profilers.
+        path (str): The path of the report.
+    """
+    if path.endswith('.csv'):
+        columns = []
+        for row in rows:
+            columns.extend(key for key in row if key not in columns)
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=columns, restval=0)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(path, 'w') as f:
+            json.dump(rows, f, indent=4)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+import os
+import glob
+import json
+import pickle
+import hashlib
+
+def code_version():
+    """
+    Get a salt for the cache keys from the source code of the package, so that results of an older version are never reused.
+    """
+    digest = hashlib.sha256()
+    for file in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), '*.py'))):
+        with open(file, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def file_hash(path):
+    """
+    Get the sha256 hash of the content of a file.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024**2), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def page_fingerprint(page):
+    """
+    Get a hash of the content of a page from its char, line, rect and curve stream. The position of the page in the document is part of the hash,
+    because the page number and doctop of the objects are part of the extracted tables.
+    """
+    digest = hashlib.sha256(repr((page.page_number, page.initial_doctop, page.bbox)).encode())
+    for kind in ['char', 'line', 'rect', 'curve']:
+        digest.update(kind.encode())
+        for obj in page.objects.get(kind, []):
+            digest.update(repr(obj).encode())
+    return digest.hexdigest()
+
+class ResultCache:
+    def __init__(self, directory, max_size=1024) -> None:
+        self.directory = directory
+        self.max_size = max_size # in MB
+        self.version = code_version()
+        if not os.path.exists(directory): os.makedirs(directory)
+
+    def key(self, path, settings):
+        """
+        Get the cache key of a pdf file.
+
+        Args:
+            path (str): The path of the pdf file.
+            settings (dict): The extraction parameters, that change the result.
+
+        Returns:
+            str: The key, a hash of the file content, the parameters and the code version.
+        """
+        return self.digest({'file': file_hash(path), 'settings': settings, 'version': self.version})
+
+    def page_key(self, page, settings):
+        """
+        Get the cache key of a single page, so that only changed pages of a revised document have to be extracted again.
+
+        Args:
+            page (Page): The pdfplumber page.
+            settings (dict): The extraction parameters, that change the result.
+
+        Returns:
+            str: The key, a hash of the page fingerprint, the parameters and the code version.
+        """
+        return self.digest({'page': page_fingerprint(page), 'settings': settings, 'version': self.version})
+
+    def digest(self, content):
+        return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+
+    def file(self, key):
+        return os.path.join(self.directory, f'{key}.pkl')
+
+    def get(self, key):
+        """
+        Get the cached tables of a key.
+
+        Returns:
+            list: The tables or None, if the key is not cached.
+        """
+        file = self.file(key)
+        try:
+            with open(file, 'rb') as f:
+                tables = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+        # mark as recently used
+        os.utime(file)
+        return tables
+
+    def contains(self, key):
+        """
+        Check if a key is cached, without loading its tables.
+        """
+        return os.path.exists(self.file(key))
+
+    def put(self, key, tables, evict=True):
+        """
+        Store the tables of a key and evict the least recently used entries, if the cache is larger than max_size.
+
+        Args:
+            key (str): The cache key.
+            tables (list): The tables to store.
+            evict (bool): Check the size of the cache. Eviction scans the whole cache directory, so the entries of single pages are stored without it
+                and the cache is only checked once per document, when the entry of the whole document is stored.
+        """
+        file = self.file(key)
+        # write to a temporary file first, so that parallel workers never read a partial entry
+        tmp = f'{file}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(tables, f)
+        os.replace(tmp, file)
+        if evict: self.evict()
+
+    def evict(self):
+        """
+        Delete the least recently used entries until the cache is not larger than max_size.
+        """
+        entries = []
+        for file in glob.glob(os.path.join(self.directory, '*.pkl')):
+            try:
+                stat = os.stat(file)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, file))
+
+        size = sum(x[1] for x in entries)
+        for _, file_size, file in sorted(entries):
+            if size <= self.max_size * 1024**2:
+                break
+            try:
+                os.remove(file)
+            except OSError:
+                pass
+            size -= file_size
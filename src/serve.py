@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import queue
+import socketserver
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from batch_inference import BatchInference
+from cli import loadModels, createExtractor
+from models import OPTIMIZATIONS
+
+class MicroBatcher:
+    def __init__(self, inference, max_wait=0.01) -> None:
+        """
+        Collect the documents of concurrent requests and run the table detection on all of their pages at once.
+
+        Args:
+            inference (BatchInference): The batched detection model.
+            max_wait (float): Maximum time in seconds a request waits for other requests, before its batch is started.
+        """
+        self.inference = inference
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        threading.Thread(target=self.loop, daemon=True).start()
+
+    def detect(self, te, page_indices):
+        """
+        Detect the tables on the given pages of a TableExtractor. Blocks until the batch with the document is done.
+        """
+        request = {'te': te, 'pages': page_indices, 'done': threading.Event(), 'error': None}
+        self.queue.put(request)
+        request['done'].wait()
+        if request['error'] is not None:
+            raise request['error']
+
+    def loop(self):
+        while True:
+            batch = [self.queue.get()]
+            pages = len(batch[0]['pages'])
+            deadline = time.monotonic() + self.max_wait
+            # wait for further requests until the batch is full or the deadline has passed
+            while pages < self.inference.batch_size:
+                try: request = self.queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty: break
+                batch.append(request)
+                pages += len(request['pages'])
+
+            try:
+                self.inference.detect([x['te'] for x in batch], [x['pages'] for x in batch])
+            except Exception as e:
+                for request in batch: request['error'] = e
+            for request in batch:
+                request['done'].set()
+
+class Extractor:
+    def __init__(self, args) -> None:
+        """
+        Keeps the models of the chosen methods loaded for the whole lifetime of the server.
+        """
+        self.args = args
+        self.models = loadModels(args)
+        self.batcher = None
+        if args.detection_method == 'model-based':
+            model, image_processor = self.models[:2]
+            self.batcher = MicroBatcher(BatchInference(model, image_processor, batch_size=args.batch_size, threads=args.threads, render_policy=args.render_policy, resolution=args.resolution), args.max_wait / 1000)
+
+    def extract(self, path):
+        """
+        Extract the tables of a pdf file.
+
+        Returns:
+            dict: The extracted tables and with the hybrid detection the indices of the pages, that were passed to the detection model.
+        """
+        with createExtractor(path, *self.models, self.args) as te:
+            if self.batcher is not None and te.cachedTables() is None:
+                # only the pages, that are not cached, are detected
+                page_indices = te.uncachedPages()
+                if len(page_indices) > 0: self.batcher.detect(te, page_indices)
+            result = {'tables': list(te.iter_tables())}
+        if self.args.detection_method == 'hybrid':
+            result['escalated_pages'] = sorted(i for i, escalated in te.escalations.items() if escalated)
+        return result
+
+    def extract_bytes(self, data):
+        """
+        Extract the tables of a pdf file, that was sent as bytes. The content is written to a temporary file first.
+        """
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+            f.write(data)
+        try:
+            return self.extract(f.name)
+        finally:
+            os.remove(f.name)
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /extract with a json body {"path": "..."} or the pdf itself (Content-Type: application/pdf) returns {"tables": [...]}, with the hybrid detection also {"escalated_pages": [...]}.
+    GET /health returns {"status": "ok"}.
+    """
+    def do_GET(self):
+        if self.path == '/health':
+            self.send_json(200, {'status': 'ok'})
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if self.path != '/extract':
+            self.send_json(404, {'error': 'not found'})
+            return
+
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            if self.headers.get('Content-Type', '').startswith('application/pdf'):
+                result = self.server.extractor.extract_bytes(body)
+            else:
+                path = json.loads(body)['path']
+                if not os.path.isfile(path):
+                    self.send_json(404, {'error': f'{path} does not exist'})
+                    return
+                result = self.server.extractor.extract(path)
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_json(400, {'error': f'invalid request: {e}'})
+            return
+        except Exception as e:
+            self.send_json(500, {'error': str(e)})
+            return
+
+        self.send_json(200, result)
+
+    def send_json(self, status, content):
+        data = json.dumps(content, default=str).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):
+        # the client address of a unix socket is an empty string
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep the models loaded and extract tables of pdf files sent over localhost http or a unix socket.")
+    parser.add_argument("--host", help="Host of the http server. Default is localhost.", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="Port of the http server. Default is 8000.", default=8000)
+    parser.add_argument("--socket", help="Path of a unix socket to listen on instead of the http port.", default=None)
+    parser.add_argument("--detection_method", choices=["rule-based", "model-based", "hybrid"], default="rule-based", help="Choose if the table detection should be a rule-based approach or with microsofts table extraction. The hybrid detection is rule-based and passes only uncertain pages to the model. Default is rule-based.")
+    parser.add_argument("--layout_method", choices=["rule-based", "model-based"], default="rule-based", help="Choose if the table layout detection should be a rule-based approach or with microsofts table extraction. Default is rule-based.")
+    parser.add_argument("--max_linespace", type=float, help="Choose a maximum for the line space until considered a new row. Default is -0.3", default=-0.3)
+    parser.add_argument("--max_charspace", type=float, help="Choose a maximum for the space between characters until considered a new column. Default is 5", default=5)
+    parser.add_argument("--batch_size", type=int, help="Maximum number of pages of concurrent requests that are passed to the detection model at once. Default is 8.", default=8)
+    parser.add_argument("--structure_scope", choices=["page", "document"], default="page", help="Batch the structure recognition of the model-based layout detection over the tables of a page or of the whole pdf. Default is page.")
+    parser.add_argument("--max_wait", type=float, help="Time in ms a request waits for other requests to fill a batch. Default is 10.", default=10)
+    parser.add_argument("--render_policy", choices=["fixed", "model"], default="fixed", help="Render the pages for the models with a fixed resolution or directly at the input size of the models (at most the given resolution). Default is fixed.")
+    parser.add_argument("--resolution", type=int, help="Resolution of the rendered pages in dpi. Default is 300.", default=300)
+    parser.add_argument("--max_memory", type=float, help="Memory budget in MB. If the resident memory exceeds it after a page, the pdf is closed and all parsed pages are freed. Default is no budget.", default=None)
+    parser.add_argument("--cache_dir", "--cache-dir", help="Directory of the result cache. Default is no cache.", default=None)
+    parser.add_argument("--cache_size", type=float, help="Maximum size of the result cache in MB. Default is 1024.", default=1024)
+    parser.add_argument("--threads", type=int, help="Number of threads torch uses for the model inference. Default is the torch default.", default=None)
+    parser.add_argument("--optimize", choices=OPTIMIZATIONS, help="Use a CPU-optimized variant of the models: int8 dynamic quantization of the linear layers and/or a traced, frozen graph. Default is the original model.", default=None)
+    parser.add_argument("--model_cache", help="Directory of the optimized models, which are converted on the first use. Default is ~/.cache/fp.", default=None)
+    parser.set_defaults(profile=None)
+    args = parser.parse_args()
+
+    if args.socket is not None:
+        if os.path.exists(args.socket): os.remove(args.socket)
+        server = UnixHTTPServer(args.socket, RequestHandler)
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), RequestHandler)
+    server.extractor = Extractor(args)
+
+    print(f"Serving on {args.socket if args.socket is not None else f'http://{args.host}:{args.port}'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket is not None and os.path.exists(args.socket): os.remove(args.socket)
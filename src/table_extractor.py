@@ -7,23 +7,39 @@ import os
 import regex as re
 import numpy as np
 import json
-
-from transformers import AutoImageProcessor, TableTransformerForObjectDetection
+import gc
+import math
+import concurrent.futures
 
 if __name__ == '__main__':  
     from table_finder import TableFinder
     from layout_extractor import LayoutExtractor
+    from page_index import PageIndex, CellBins, CellTexts
+    from page_render import PageRenderer, render_resolution
+    from memory import current_rss
+    from profiler import Profiler
+    from batch_inference import BatchInference
+    from models import load_model, DETECTION_MODEL, STRUCTURE_MODEL
 else:
     try: from .table_finder import TableFinder
     except: from table_finder import TableFinder
     try: from .layout_extractor import LayoutExtractor
     except: from layout_extractor import LayoutExtractor
+    try: from .page_index import PageIndex, CellBins, CellTexts
+    except: from page_index import PageIndex, CellBins, CellTexts
+    try: from .page_render import PageRenderer, render_resolution
+    except: from page_render import PageRenderer, render_resolution
+    try: from .memory import current_rss
+    except: from memory import current_rss
+    try: from .profiler import Profiler
+    except: from profiler import Profiler
+    try: from .batch_inference import BatchInference
+    except: from batch_inference import BatchInference
 
 class TableExtractor:
-    def __init__(self, path, separate_units=False, detection_method='rule-based', layout_method='rule-based', model=None, image_processor=None, layout_model=None, layout_processor=None, max_column_space=4, max_row_space=-0.3):
+    def __init__(self, path, separate_units=False, detection_method='rule-based', layout_method='rule-based', model=None, image_processor=None, layout_model=None, layout_processor=None, max_column_space=4, max_row_space=-0.3, render_policy='fixed', resolution=300, max_memory=None, cache=None, profile=False, structure_batch_size=8, structure_scope='page'):
         self.path = path
-        pdf = pdfplumber.open(path)
-        self.pages = pdf.pages
+        self.pdf = None # opened lazily on the first access of the pages
         self.separate_units = separate_units
         self.detection_method = detection_method
         self.layout_method = layout_method
@@ -33,6 +49,54 @@ class TableExtractor:
         self.layout_processor = layout_processor
         self.max_column_space = max_column_space
         self.max_row_space = max_row_space
+        self.render_policy = render_policy
+        self.resolution = resolution
+        self.max_memory = max_memory # RSS budget in MB
+        self.memory_limit = max_memory # RSS above which the pdf is closed, raised if the memory stays above the budget without the pdf
+        self.structure_batch_size = structure_batch_size
+        self.structure_scope = structure_scope # batch the structure recognition per 'page' or per 'document'
+        self.settings = {'path': path, 'separate_units': separate_units, 'detection_method': detection_method, 'layout_method': layout_method, 'model': model, 'image_processor': image_processor, 'layout_model': layout_model, 'layout_processor': layout_processor, 'max_column_space': max_column_space, 'max_row_space': max_row_space, 'render_policy': render_policy, 'resolution': resolution, 'max_memory': max_memory, 'profile': profile, 'structure_batch_size': structure_batch_size, 'structure_scope': structure_scope}
+        self.detections = {} # model detections per page index, filled by BatchInference.detect
+        self.found_tables = {} # tables per page index, that were found ahead of the extraction by recognizeDocumentStructures
+        self.structures = {} # structure detections of the tables per page index
+        self.escalations = {} # page index -> True if the hybrid detection passed the page to the detection model
+        self.cache = cache # ResultCache for the tables of whole documents
+        self.cache_key = None
+        self.page_keys = {} # cache keys per page index, the content of the pdf does not change
+        self.profile = Profiler(profile, path) # wall time and counters per page and stage
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def pages(self):
+        """
+        The pages of the pdf. The pdf is opened on the first access and again after it has been closed.
+        """
+        if self.pdf is None:
+            self.pdf = pdfplumber.open(self.path)
+        return self.pdf.pages
+
+    def close(self, keep_pending=False):
+        """
+        Close the pdf and free the objects of all pages. The pdf is reopened, if the pages are accessed again.
+
+        Parameters:
+            keep_pending (bool): Keep the tables and structures, that were found ahead of the extraction of their pages (see recognizeDocumentStructures), e.g. if the pdf is only closed to free memory.
+        """
+        if not keep_pending:
+            self.found_tables = {}
+            self.structures = {}
+        if self.pdf is None:
+            return
+        for page in self.pdf.pages:
+            PageIndex.release(page)
+            PageRenderer.release(page)
+        self.pdf.close()
+        self.pdf = None
 
     def tableToDataframe(self, table):
         """
@@ -102,13 +166,14 @@ class TableExtractor:
             return dataframe.to_latex(f'{path}.csv', index=False)     
             
 
-    def shrink_cell(self, page, cell):
+    def shrink_cell(self, page, cell, bins=None):
         """
         Calculate the coordinates of the smallest bounding box that contains all non-empty characters within a given cell on a page.
 
         Parameters:
             page (Page): The page object containing the cell.
             cell (tuple): The coordinates of the cell in the format (x0, y0, x1, y1).
+            bins (CellBins): The chars of the table binned into its cells. If not provided, the chars are searched in the page index.
 
         Returns:
             list: The coordinates of the smallest bounding box in the format [x0, y0, x1, y1].
@@ -117,7 +182,8 @@ class TableExtractor:
         cell[1]+=0.5
         cell[2]-=0.2
         cell[3]-=0.5
-        pagecrop = [x for x in page.crop(cell).chars if x['text'] not in [' ', '.']] # remove white spaces and dots because they should not be part of the cell
+        source = PageIndex.for_page(page) if bins is None else bins
+        pagecrop = [x for x in source.chars(cell) if x['text'] not in [' ', '.']] # remove white spaces and dots because they should not be part of the cell
 
         b1 = min(pagecrop, key=lambda e: e['x0'], default={'x0': cell[0]-0.2})
         b2 = min(pagecrop, key=lambda e: e['top'], default={'top': cell[1]-0.5})
@@ -126,7 +192,7 @@ class TableExtractor:
 
         return [b1['x0'], b2['top'], b3['x1'], b4['bottom']]
 
-    def merge_cells(self, pdfplumber_table, table, page):
+    def merge_cells(self, pdfplumber_table, table, page, bins=None):
         """
         Merge cells in the PDF table based on certain conditions.
 
@@ -134,14 +200,20 @@ class TableExtractor:
             pdfplumber_table: the pdfplumber table object
             table: the table dictionary
             page: the pdfplumber page object
+            bins: the chars of the table binned into its cells (CellBins). Built from the cells of the table if not provided.
         """
+        index = PageIndex.for_page(page)
+        if bins is None: bins = CellBins(index, pdfplumber_table.cells)
+        texts = CellTexts(pdfplumber_table.page.chars)
         dot_lines = [x for x in table['lines'] if 'dot_line' in x.keys()]
 
+        # the rows are only grouped again after cells have been merged
+        rows = pdfplumber_table.rows
         i=0
-        while i < len(pdfplumber_table.rows):
-            row = pdfplumber_table.rows[i]
+        while i < len(rows):
+            row = rows[i]
 
-            idxs = [i for i,x in enumerate(pdfplumber_table.extract()[i]) if x != '' and x is not None]
+            idxs = [i for i,x in enumerate(texts.row(row)) if x != '' and x is not None]
 
             if len(idxs) == 0:
                 i+=1
@@ -150,16 +222,16 @@ class TableExtractor:
             cell = row.cells[idxs[0]]
 
             # merge rows in the header that share the same layout and are not intersecting with a ruling line
-            if cell[3] <= table['header'] and i < len(pdfplumber_table.rows)-1:
+            if cell[3] <= table['header'] and i < len(rows)-1:
                 cells = [x for x in row.cells if x is not None]
-                next_cells = [x for x in pdfplumber_table.rows[i+1].cells if x is not None]
+                next_cells = [x for x in rows[i+1].cells if x is not None]
                 if len(cells) != len(next_cells):
                     i+=1
                     continue
                 bbox = table['bbox'].copy()
                 bbox[3] = next_cells[0][3]-2
                 bbox[1] = cells[0][1]
-                lines = page.crop(bbox).lines
+                lines = index.lines(bbox)
                 if len(lines) > 0 or bbox[3] > table['header']:
                     i+=1
                     continue
@@ -177,9 +249,10 @@ class TableExtractor:
                     pdfplumber_table.cells.append(new_cell)
                     pdfplumber_table.cells.remove(next_cell)
                 
+                rows = pdfplumber_table.rows
                 continue         
 
-            try: chars = [x for x in page.crop(cell).chars if x['text'] != ' ']
+            try: chars = [x for x in bins.chars(cell) if x['text'] != ' ']
             except: continue
 
             if len(chars) == 0:
@@ -188,7 +261,7 @@ class TableExtractor:
             
 
             # merge cells in the first column in the body
-            if len(idxs) == 1 and idxs[0] == 0 and i < len(pdfplumber_table.rows)-1:
+            if len(idxs) == 1 and idxs[0] == 0 and i < len(rows)-1:
                 if chars[-1]['text'] == ':':
                     i+=1
                     continue
@@ -205,12 +278,12 @@ class TableExtractor:
                     continue
                 
 
-                next_cell = pdfplumber_table.rows[i+1].cells[idxs[0]]
+                next_cell = rows[i+1].cells[idxs[0]]
                 if next_cell is None:
                     i+=1
                     continue
 
-                next_row_char = [x for x in page.crop(next_cell).chars if x['text'] != ' ']
+                next_row_char = [x for x in bins.chars(next_cell) if x['text'] != ' ']
                 if len(next_row_char) == 0:
                     i+=1
                     continue
@@ -228,7 +301,7 @@ class TableExtractor:
                 bbox = table['bbox'].copy()
                 bbox[3] = next_cell[3]
                 bbox[1] = cell[1]+1
-                lines = page.crop(bbox).lines
+                lines = index.lines(bbox)
                 if len(lines) > 0:
                     #if len(tuple([x['top'] for x in lines])) == 1:
                     i+=1
@@ -246,15 +319,16 @@ class TableExtractor:
                     new_cell = tuple(lst)
                     pdfplumber_table.cells.append(new_cell)
                     pdfplumber_table.cells.remove(next_cell)
+                rows = pdfplumber_table.rows
 
             # merge cells in the second column in the body
             elif len(idxs) == 1 and idxs[0] > 0 and i!= 0:
-                previous_cell = pdfplumber_table.rows[i-1].cells[idxs[0]]
+                previous_cell = rows[i-1].cells[idxs[0]]
                 if previous_cell is None:
                     i+=1
                     continue
 
-                previous_row_char = [x for x in page.crop(previous_cell).chars if x['text'] != ' ']
+                previous_row_char = [x for x in bins.chars(previous_cell) if x['text'] != ' ']
                 if len(previous_row_char) == 0:
                     i+=1
                     continue            
@@ -270,7 +344,7 @@ class TableExtractor:
                 bbox = table['bbox'].copy()
                 bbox[1] = previous_cell[1]
                 bbox[3] = cell[3]-1
-                if len(page.crop(bbox).lines) > 0:
+                if len(index.lines(bbox)) > 0:
                     i+=1
                     continue
 
@@ -286,10 +360,11 @@ class TableExtractor:
                     pdfplumber_table.cells.remove(previous_cell)
                 for cell in pdfplumber_table.rows[i].cells:
                     if cell != None: pdfplumber_table.cells.remove(cell)
+                rows = pdfplumber_table.rows
             else:
                 i+=1
 
-    def extractTable(self, page, table_index=0, table=None, img_path=None, image=None, overwrite=False):
+    def extractTable(self, page, table_index=0, table=None, img_path=None, image=None, overwrite=False, structure=None):
         """
         Extracts a table from a given page. Either by rule-based or custom method, based on pdfplumbers table extraction.
 
@@ -300,6 +375,7 @@ class TableExtractor:
             img_path (str): The path where the extracted table image should be saved. Default is None.
             image (PIL.Image.Image): The image of the page. If not provided, the function will use the image from the page object.
             overwrite (bool): Whether to overwrite the image if it already exists. Default is False.
+            structure (dict): Precomputed detections of the structure model for the table (see recognizeStructures). Only used with the model-based layout detection.
 
         Returns:
             dict: The table dictionary containing the table's bounding box, settings, cells, and extracted text. Returns None if no table is found.
@@ -308,7 +384,10 @@ class TableExtractor:
         if table == None:
             page = copy.copy(self.pages[0])
             tf = TableFinder(page, model=self.model, image_processor=self.image_processor)
-            tables = tf.find_tables(detection_method=self.detection_method, image=image if image is not None else page.to_image(resolution=300))
+            render = lambda: self.renderForDetection(page)
+            if image is None and self.detection_method == 'model-based':
+                image = render()
+            tables = tf.find_tables(detection_method=self.detection_method, image=image, render=render)
 
             if table_index >= len(tables):
                 return None
@@ -320,58 +399,71 @@ class TableExtractor:
         # get table with the table settings
         le = LayoutExtractor(table, page_crop, separate_units=self.separate_units)
         if self.layout_model is None and self.layout_processor is None: 
-            col_sep, row_sep = le.find_layout(self.max_column_space, self.max_row_space)
+            with self.profile.stage('find_layout') as stage:
+                col_sep, row_sep = le.find_layout(self.max_column_space, self.max_row_space)
+                stage.count(lines=len(table['lines']))
         else:
-            col_sep, row_sep = le.find_model_layout(self.layout_model, self.layout_processor)
+            with self.profile.stage('find_model_layout') as stage:
+                col_sep, row_sep = le.find_model_layout(self.layout_model, self.layout_processor, render_policy=self.render_policy, resolution=self.resolution, structure=structure)
+                stage.count(lines=len(table['lines']))
         table['settings'] = le.get_table_settings()
-        pdfplumber_table = page_crop.find_table(table['settings'])
+        with self.profile.stage('find_table'):
+            pdfplumber_table = page_crop.find_table(table['settings'])
 
         if pdfplumber_table == None or len(pdfplumber_table.rows) <= 2 or len(col_sep) == 0:
             return None
 
+        # bin the chars into the cells once instead of searching the page for every cell
+        bins = CellBins(PageIndex.for_page(page), pdfplumber_table.cells)
+
         # merge cells only with the rule-based layout detection
-        if self.layout_method != 'model-based': self.merge_cells(pdfplumber_table, table, page)
+        if self.layout_method != 'model-based':
+            with self.profile.stage('merge_cells'):
+                self.merge_cells(pdfplumber_table, table, page, bins)
        
         # reformat and shrink table cells and define layout
         table_cells = []
         table_layout = []
-        for row in pdfplumber_table.rows:
-            row_layout = []
-            last_cell_text = ''
-            for cell in row.cells:
-                try: 
-                    if cell is None:
-                        row_layout.append({'bbox': None, 'text': last_cell_text})
+        with self.profile.stage('cells') as stage:
+            for row in pdfplumber_table.rows:
+                row_layout = []
+                last_cell_text = ''
+                for cell in row.cells:
+                    try: 
+                        if cell is None:
+                            row_layout.append({'bbox': None, 'text': last_cell_text})
+                            continue
+
+                        bbox = self.shrink_cell(page, list(cell), bins)
+                        if bbox == list(cell) or bbox[0] == bbox[2] or bbox[1] == bbox[3]: 
+                            text = ''
+                        else:
+                            text = bins.text(page_crop, bbox)
+                            table_cells.append({'bbox': bbox, 'text': text.replace('\n', ' ').replace('.', ''), 'original_bbox': cell})
+                            text = text.replace('\n', ' ').replace(' . ', '').replace('..', '')
+                        row_layout.append({'bbox': bbox, 'text': text})
+                        last_cell_text = text
+                    except:
                         continue
 
-                    bbox = self.shrink_cell(page, list(cell))
-                    if bbox == list(cell) or bbox[0] == bbox[2] or bbox[1] == bbox[3]: 
-                        text = ''
-                    else:
-                        text = page_crop.crop(bbox).extract_text()                 
-                        table_cells.append({'bbox': bbox, 'text': text.replace('\n', ' ').replace('.', ''), 'original_bbox': cell})
-                        text = text.replace('\n', ' ').replace(' . ', '').replace('..', '')
-                    row_layout.append({'bbox': bbox, 'text': text})
-                    last_cell_text = text
-                except:
-                    continue
-
-            table_layout.append(row_layout)
+                table_layout.append(row_layout)
+            stage.count(cells=len(table_cells))
 
         table['cells'] = table_cells
         table['layout'] = table_layout
         
         # save image
         if img_path is not None: 
-            image = page_crop.to_image(resolution=300)
-            image.draw_lines(table['lines'], stroke_width=3, stroke=(0,0,0)) # redraw existing lines
-            image.debug_tablefinder(table['settings'])
-            if not os.path.exists(img_path): os.mkdir(img_path)
-            name = f'{img_path}/{os.path.basename(self.path)[0:-4]}_table_{table_index}.png'
-            if os.path.exists(name) and overwrite==False:
-                inp = input("File already exists. Overwrite (yes/no)?\n")
-                if inp in ["y", "yes"]: image.save(name)
-            else: image.save(name)
+            with self.profile.stage('save_image'):
+                image = PageRenderer.for_page(page).render(page_crop, resolution=self.resolution)
+                image.draw_lines(table['lines'], stroke_width=3, stroke=(0,0,0)) # redraw existing lines
+                image.debug_tablefinder(table['settings'])
+                if not os.path.exists(img_path): os.mkdir(img_path)
+                name = f'{img_path}/{os.path.basename(self.path)[0:-4]}_table_{table_index}.png'
+                if os.path.exists(name) and overwrite==False:
+                    inp = input("File already exists. Overwrite (yes/no)?\n")
+                    if inp in ["y", "yes"]: image.save(name)
+                else: image.save(name)
 
         tf = None
         le = None
@@ -391,19 +483,29 @@ class TableExtractor:
             list: A list of extracted tables.
         """
         extracted_tables = []
+        self.profile.page = page_index
 
         page = self.pages.copy()[page_index]
-        tf = TableFinder(page, model=self.model, image_processor=self.image_processor)
 
+        # render the debug image first, so that a smaller detection image can be downscaled from it
         image=None
-        if img_path is not None or self.detection_method == 'model-based' or self.layout_method == 'model-based':
-            image = page.to_image(resolution=300)
+        if img_path is not None:
+            image = PageRenderer.for_page(page).render(resolution=self.resolution)
+
+        tables_found = self.found_tables.pop(page_index, None)
+        if tables_found is None:
+            tables_found = self.findTables(page_index)
 
-        tables_found = tf.find_tables(detection_method=self.detection_method, image=image)
+        # run the structure recognition for all tables of the page at once
+        structures = self.structures.pop(page_index, None)
+        if structures is None and not (self.layout_model is None and self.layout_processor is None):
+            with self.profile.stage('recognize_structures') as stage:
+                structures = self.recognizeStructures([(page, x) for x in tables_found])
+                stage.count(tables=len(tables_found))
 
         # get table layout and cells for every table
         for table_index, tablebox in enumerate(tables_found):
-            table = self.extractTable(page, table_index=table_index, table=tablebox, image=image)
+            table = self.extractTable(page, table_index=table_index, table=tablebox, image=image, structure=None if structures is None else structures[table_index])
             if table is None: 
                 continue
 
@@ -418,22 +520,314 @@ class TableExtractor:
         
         # save image
         if img_path is not None: 
-            if not os.path.exists(img_path): os.mkdir(img_path)
-            name = f'{img_path}/{self.path.replace("/", "_")[0:-4]}_page_{page_index}.png'
-            if os.path.exists(name) and overwrite==False:
-                inp = input("File already exists. Overwrite (yes/no)?\n")
-                if inp in ["y", "yes"]: image.save(name)
-            else: image.save(name)
+            with self.profile.stage('save_image'):
+                if not os.path.exists(img_path): os.mkdir(img_path)
+                name = f'{img_path}/{self.path.replace("/", "_")[0:-4]}_page_{page_index}.png'
+                if os.path.exists(name) and overwrite==False:
+                    inp = input("File already exists. Overwrite (yes/no)?\n")
+                    if inp in ["y", "yes"]: image.save(name)
+                else: image.save(name)
 
+        # the rendered page is not needed anymore
+        PageRenderer.release(page)
 
-        tf = None
-        
-       
-        tf = None
-        
         return extracted_tables
 
-    def extractTables(self, page_index=None, img_path=None, overwrite=False):
+    def findTables(self, page_index):
+        """
+        Find the bounding boxes of the tables on a page. With the model-based detection, the detections of BatchInference are used if available. With the hybrid detection, the page is only rendered if it is passed to the model, which is recorded in self.escalations.
+
+        Parameters:
+            page_index (int): The index of the page.
+
+        Returns:
+            list: The tables found by TableFinder.
+        """
+        page = self.pages[page_index]
+        tf = TableFinder(page, model=self.model, image_processor=self.image_processor)
+
+        def render():
+            with self.profile.stage('render'):
+                return self.renderForDetection(page)
+
+        detections = self.detections.get(page_index)
+        detection_image=None
+        if self.detection_method == 'model-based' and detections is None:
+            detection_image = render()
+
+        with self.profile.stage('find_tables') as stage:
+            tables_found = tf.find_tables(detection_method=self.detection_method, image=detection_image, detections=detections, render=render)
+            if self.profile.enabled: stage.count(chars=len(page.chars), lines=len(page.lines), tables=len(tables_found))
+            if self.detection_method == 'hybrid':
+                self.escalations[page_index] = tf.escalated
+                stage.count(escalated=int(tf.escalated))
+
+        return tables_found
+
+    def renderForDetection(self, page):
+        """
+        Render a page for the detection model. With the model-based layout detection, the page is rasterized once with the full resolution,
+        so that the tables are cut out of the same image for the structure model.
+
+        Parameters:
+            page (Page): The pdfplumber page.
+
+        Returns:
+            PageImage: The image of the page with the resolution of the detection model.
+        """
+        renderer = PageRenderer.for_page(page)
+        if self.layout_method == 'model-based':
+            renderer.render(resolution=self.resolution)
+        return renderer.render(resolution=render_resolution(page, self.image_processor, self.render_policy, self.resolution))
+
+    def recognizeStructures(self, items, max_aspect_change=1.25, max_pending=2):
+        """
+        Run the structure recognition model for several tables at once, in padded batches of structure_batch_size tables instead of one forward pass per table.
+        The table images are collected in buckets of similar aspect ratios, so that they are padded as little as possible. A bucket runs as soon as it is full
+        and its images are dropped afterwards, so only a bounded number of images is kept, even for the tables of a whole document.
+
+        Parameters:
+            items (iterable): Tuples of the page and a table found by TableFinder, e.g. the tables of a page or a generator over the tables of a document.
+            max_aspect_change (float): Maximum ratio between the aspect ratios of the tables in a batch.
+            max_pending (int): Maximum number of waiting images in multiples of structure_batch_size. If it is exceeded, the fullest bucket runs, even if it is not full. Default is 2.
+
+        Returns:
+            list: The detections of the structure model for every table (None if the table can not be cropped), which are passed to extractTable.
+        """
+        inference = BatchInference(self.layout_model, self.layout_processor, batch_size=self.structure_batch_size, threshold=0.7)
+        aspect = lambda image: image.original.size[1] / image.original.size[0]
+        structures = []
+        buckets = {} # (index, image) of the waiting tables per aspect ratio class
+
+        def run(batch):
+            for (i, _), structure in zip(batch, inference.run([image for _, image in batch], page_coordinates=True)):
+                structures[i] = structure
+
+        pending = 0
+        for i, (page, table) in enumerate(items):
+            structures.append(None)
+            try: page_crop = page.crop(table['bbox'])
+            except: continue
+            image = LayoutExtractor(table, page_crop, separate_units=self.separate_units).structure_image(self.layout_processor, self.render_policy, self.resolution)
+
+            # the aspect ratios in a bucket differ by less than max_aspect_change
+            bucket = buckets.setdefault(math.floor(math.log(aspect(image), max_aspect_change)), [])
+            bucket.append((i, image))
+            pending += 1
+            if len(bucket) < self.structure_batch_size and pending <= max_pending * self.structure_batch_size:
+                continue
+            if len(bucket) < self.structure_batch_size:
+                bucket = max(buckets.values(), key=len)
+            run(bucket)
+            pending -= len(bucket)
+            bucket.clear()
+
+        # batch the remaining tables of neighbouring buckets
+        batches = []
+        for i, image in sorted((x for bucket in buckets.values() for x in bucket), key=lambda e: aspect(e[1])):
+            if len(batches) == 0 or len(batches[-1][1]) == self.structure_batch_size or aspect(image) > batches[-1][0] * max_aspect_change:
+                batches.append((aspect(image), []))
+            batches[-1][1].append((i, image))
+        buckets = None
+
+        for _, batch in batches:
+            run(batch)
+        return structures
+
+    def recognizeDocumentStructures(self, page_indices=None):
+        """
+        Find the tables of several pages and run the structure recognition for all of them at once, so that the batches are filled across pages.
+        The tables and their structures are kept until the pages are extracted by extractTablesInPage. A page is released as soon as its tables are rendered.
+
+        Parameters:
+            page_indices (list): The indices of the pages. Default is all pages.
+        """
+        if page_indices is None:
+            page_indices = range(len(self.pages))
+
+        owners = [] # page index of every table
+
+        def tables():
+            for page_index in page_indices:
+                self.profile.page = page_index
+                self.found_tables[page_index] = self.findTables(page_index)
+                page = self.pages[page_index]
+                for table in self.found_tables[page_index]:
+                    owners.append(page_index)
+                    yield page, table
+                # the images of the tables are rendered -> the page is parsed again for its extraction
+                self.releasePage(page_index)
+
+        with self.profile.stage('recognize_structures') as stage:
+            structures = self.recognizeStructures(tables())
+            stage.count(tables=len(structures))
+
+        for page_index in page_indices:
+            self.structures[page_index] = [structure for i, structure in zip(owners, structures) if i == page_index]
+
+    def releasePage(self, page_index):
+        """
+        Free the parsed objects, the index and the rendered image of a page after its extraction. The page is parsed again, if it is used later.
+        If the memory of the process exceeds max_memory, the whole pdf is closed. If the memory stays above max_memory without the pdf (e.g. with loaded models),
+        it is only closed again, once the pdf added another tenth of the budget.
+
+        Parameters:
+            page_index (int): The index of the page.
+        """
+        page = self.pages[page_index]
+        PageIndex.release(page)
+        PageRenderer.release(page)
+        page.close()
+
+        if self.max_memory is not None and current_rss() > self.memory_limit:
+            # the parser of pdfminer keeps resolved objects of all pages -> drop the whole document, it is reopened for the next page
+            self.close(keep_pending=True)
+            gc.collect()
+            self.memory_limit = max(self.max_memory, current_rss() + 0.1 * self.max_memory)
+
+    def pageTables(self, page_index, img_path=None, overwrite=False):
+        """
+        Extracts the tables of a page and releases the page afterwards. With a cache, the page is only extracted, if its content changed since a previous run.
+
+        Parameters:
+            page_index (int): The index of the page.
+            img_path (str): The path to save the image of the page with extracted tables.
+            overwrite (bool): Whether to overwrite the image if it already exists.
+
+        Returns:
+            list: A list of extracted tables.
+        """
+        key = None
+        if self.cache is not None and img_path is None:
+            key = self.pageKey(page_index)
+            tables = self.cache.get(key)
+            if tables is not None:
+                self.profile.page = page_index
+                self.profile.add('cache_hit', 0.0)
+                self.releasePage(page_index)
+                return tables
+
+        tables = self.extractTablesInPage(page_index, img_path, overwrite)
+        self.releasePage(page_index)
+
+        if key is not None:
+            # the cache is evicted once per document by iter_tables
+            self.cache.put(key, tables, evict=False)
+        return tables
+
+    def pageKey(self, page_index):
+        """
+        Get the cache key of a page. It is computed once per page.
+        """
+        if page_index not in self.page_keys:
+            self.page_keys[page_index] = self.cache.page_key(self.pages[page_index], self.cacheSettings())
+        return self.page_keys[page_index]
+
+    def uncachedPages(self):
+        """
+        Get the pages, whose tables are not in the cache, so that the models that run ahead of the extraction (BatchInference.detect, recognizeDocumentStructures) skip the cached pages.
+        The pages are released after their key is computed.
+
+        Returns:
+            list: The page indices. All pages, if there is no cache.
+        """
+        if self.cache is None:
+            return list(range(len(self.pages)))
+
+        page_indices = []
+        for page_index, page in enumerate(self.pages):
+            if not self.cache.contains(self.pageKey(page_index)):
+                page_indices.append(page_index)
+            page.close()
+        return page_indices
+
+    def cacheSettings(self):
+        """
+        Get the parameters, that change the extracted tables and are therefore part of the cache key.
+        """
+        settings = {k: self.settings[k] for k in ['detection_method', 'layout_method', 'max_column_space', 'max_row_space', 'separate_units']}
+        if 'model-based' in [self.detection_method, self.layout_method] or self.detection_method == 'hybrid':
+            settings['render_policy'] = self.render_policy
+            settings['resolution'] = self.resolution
+            settings['model'] = None if self.model is None else self.model.config._name_or_path
+            settings['layout_model'] = None if self.layout_model is None else self.layout_model.config._name_or_path
+            # quantized models give slightly different results
+            settings['optimization'] = [getattr(self.model, 'optimization', None), getattr(self.layout_model, 'optimization', None)]
+        if self.layout_method == 'model-based':
+            # the padding of the batched tables changes the structure detections slightly
+            settings['structure_batch_size'] = self.structure_batch_size
+            settings['structure_scope'] = self.structure_scope
+        return settings
+
+    def cachedTables(self):
+        """
+        Get the tables of the document from the cache, without parsing the pdf.
+
+        Returns:
+            list: The cached tables or None, if there is no cache or the document is not cached with the current settings.
+        """
+        if self.cache is None:
+            return None
+        if self.cache_key is None:
+            self.cache_key = self.cache.key(self.path, self.cacheSettings())
+        return self.cache.get(self.cache_key)
+
+    def iter_tables(self, img_path=None, overwrite=False, workers=1, max_tasks_per_child=None):
+        """
+        Extracts the tables of all pages and yields every table as soon as its page is done. The objects of a page are released before the next page is parsed,
+        so the memory does not grow with the length of the document.
+        With a cache, the tables of an unchanged document are loaded without parsing it (unless images are requested) and new results are stored after the last page, which also evicts the least recently used entries of the cache.
+
+        Parameters:
+            img_path (str): The path to save the images of the pages with extracted tables.
+            overwrite (bool): Whether to overwrite the image if it already exists.
+            workers (int): Number of processes the pages are distributed to. Every process opens the pdf itself. Default is 1.
+            max_tasks_per_child (int): Number of pages after which a worker process is replaced by a new one. Default is None, the workers release every page and are not replaced.
+
+        Yields:
+            dict: The extracted tables in page order.
+        """
+        tables = self.cachedTables() if img_path is None else None
+        if tables is not None:
+            self.profile.add('cache_hit', 0.0)
+            yield from tables
+            return
+
+        # only keep the tables in memory, if they are stored afterwards
+        tables = [] if self.cache is not None else None
+        for table in self.extractPages(img_path, overwrite, workers, max_tasks_per_child):
+            if tables is not None: tables.append(table)
+            yield table
+
+        if self.cache is not None:
+            if self.cache_key is None:
+                self.cache_key = self.cache.key(self.path, self.cacheSettings())
+            self.cache.put(self.cache_key, tables)
+
+    def extractPages(self, img_path=None, overwrite=False, workers=1, max_tasks_per_child=None):
+        """
+        Generator over the tables of all pages, used by iter_tables.
+        """
+        if workers > 1 and len(self.pages) > 1:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=max_tasks_per_child, initializer=initPageWorker, initargs=(self.settings, self.detections, self.cache)) as executor:
+                results = [executor.submit(extractPageInWorker, i, img_path, overwrite) for i in range(len(self.pages))]
+                # yield in page order
+                for i, result in enumerate(results):
+                    tables, profile, escalated = result.result()
+                    self.profile.merge(profile)
+                    if escalated is not None: self.escalations[i] = escalated
+                    self.profile.page = i
+                    yield from tables
+            return
+
+        # fill the batches of the structure recognition with the tables of all pages, that have to be extracted
+        if self.structure_scope == 'document' and not (self.layout_model is None and self.layout_processor is None):
+            self.recognizeDocumentStructures(self.uncachedPages() if img_path is None else None)
+
+        for i in range(len(self.pages)):
+            yield from self.pageTables(i, img_path, overwrite)
+
+    def extractTables(self, page_index=None, img_path=None, overwrite=False, workers=1, max_tasks_per_child=None):
         """
         Extracts tables from the specified page or all pages if no page index is provided.
         
@@ -441,6 +835,8 @@ class TableExtractor:
             page_index (int): The index of the page to extract tables from. If not provided, tables will be extracted from all pages.
             img_path (str): The path to the image file containing the page. Required if page_index is provided.
             overwrite (bool): Whether to overwrite the image if it already exists.
+            workers (int): Number of processes the pages are distributed to. Every process opens the pdf itself. Default is 1.
+            max_tasks_per_child (int): Number of pages after which a worker process is replaced by a new one. Default is None, the workers release every page and are not replaced.
         
         Returns:
             list: A list of extracted tables.
@@ -448,11 +844,25 @@ class TableExtractor:
         if page_index != None:
             return self.extractTablesInPage(page_index, img_path, overwrite)
 
-        extracted_tables = []
-        for i in range(len(self.pages)):
-            extracted_tables.extend(self.extractTablesInPage(i, img_path, overwrite))
-        
-        return extracted_tables
+        return list(self.iter_tables(img_path, overwrite, workers, max_tasks_per_child))
+
+# TableExtractor of a page worker process, created by initPageWorker
+page_worker_extractor = None
+
+def initPageWorker(settings, detections, cache=None):
+    """
+    Open the pdf once in a worker process of TableExtractor.extractTables.
+    """
+    global page_worker_extractor
+    page_worker_extractor = TableExtractor(**settings, cache=cache)
+    page_worker_extractor.detections = detections
+
+def extractPageInWorker(page_index, img_path, overwrite):
+    tables = page_worker_extractor.pageTables(page_index, img_path, overwrite)
+    # send the profile of the page to the main process
+    profile = page_worker_extractor.profile.report()
+    page_worker_extractor.profile.stages = {}
+    return tables, profile, page_worker_extractor.escalations.pop(page_index, None)
 
 if __name__ == '__main__':  
     detection_method = 'rule-based'
@@ -464,11 +874,9 @@ if __name__ == '__main__':
     structure_image_processor = None
 
     if detection_method == 'model-based':
-        image_processor = AutoImageProcessor.from_pretrained("microsoft/table-transformer-detection")
-        model = TableTransformerForObjectDetection.from_pretrained("microsoft/table-transformer-detection")
+        model, image_processor = load_model(DETECTION_MODEL)
     if layout_method == 'model-based':
-        structure_image_processor = AutoImageProcessor.from_pretrained("microsoft/table-transformer-structure-recognition")
-        structure_model = TableTransformerForObjectDetection.from_pretrained("microsoft/table-transformer-structure-recognition")       
+        structure_model, structure_image_processor = load_model(STRUCTURE_MODEL)
     
     te = TableExtractor(path="examples/pdf/FDX/2017/page_26.pdf", separate_units=False, detection_method=detection_method, layout_method=layout_method, model=model, image_processor=image_processor, layout_model=structure_model, layout_processor=structure_image_processor, max_column_space=4, max_row_space=-0.3)
     tables = te.extractTables(img_path='.', overwrite=True)
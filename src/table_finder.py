@@ -1,16 +1,46 @@
 #!/usr/bin/env python3
 import pdfplumber
 import statistics
-import itertools
-import torch
+import numpy as np
+
+if __name__ == "__main__":
+    from page_index import PageIndex
+    from batch_inference import BatchInference
+else:
+    try:
+        from .page_index import PageIndex
+        from .batch_inference import BatchInference
+    except ImportError:
+        from page_index import PageIndex
+        from batch_inference import BatchInference
 
 class TableFinder:
     def __init__(self, page, model=None, image_processor=None) -> None:
         self.page = page
+        self.index = PageIndex.for_page(page)
         self.lines = page.lines
         self.tables = []
         self.model = model
         self.image_processor = image_processor
+        self.boundaries = {} # results of the find_table_* functions, the candidates of one table mostly search the same areas
+        self.escalated = False # the hybrid detection passed the page to the model
+
+    def boundary(self, finder, bbox, *args):
+        """
+        Call one of the find_table_* functions and reuse its result, if it was already called with the same arguments. The chars of the page do not change while the tables are found.
+
+        Args:
+            finder (function): The function, e.g. self.find_table_bottom.
+            bbox (list): The bounding box to search in.
+            *args: The remaining arguments of the function.
+
+        Returns:
+            float: The boundary found by the function.
+        """
+        key = (finder.__name__, tuple(bbox), args)
+        if key not in self.boundaries:
+            self.boundaries[key] = finder(bbox, *args)
+        return self.boundaries[key]
 
     def find_table_top(self, bbox, max_diff, must_contain_chars=False):
         """
@@ -25,7 +55,7 @@ class TableFinder:
             int: The top position of the table.
 
         """
-        chars = sorted(self.page.crop(bbox, strict=False).chars, key=lambda e: e['top'], reverse=True)
+        chars = sorted(self.index.chars(bbox, strict=False), key=lambda e: e['top'], reverse=True)
         if not must_contain_chars: chars.insert(0, {'top': bbox[3], 'bottom': bbox[3], 'text': '_'})
 
         i=0
@@ -53,7 +83,7 @@ class TableFinder:
             int: The bottom coordinate of the table.
 
         """
-        chars = sorted(self.page.crop(bbox, strict=False).chars, key=lambda e: e['bottom'])
+        chars = sorted(self.index.chars(bbox, strict=False), key=lambda e: e['bottom'])
         if not must_contain_chars: chars.insert(0, {'top': bbox[1], 'bottom': bbox[1], 'text': '_'})
 
         i=0
@@ -84,7 +114,7 @@ class TableFinder:
         if bbox[0] == bbox[2]:
             return self.page.bbox[0]
 
-        chars = sorted(self.page.crop(bbox).chars, key=lambda e: e['x1'], reverse=True)
+        chars = sorted(self.index.chars(bbox), key=lambda e: e['x1'], reverse=True)
         chars.insert(0, {'x0': bbox[2], 'x1': bbox[2], 'text': '_'})
 
         i=0
@@ -115,7 +145,7 @@ class TableFinder:
         if bbox[2] <= bbox[0]:
             return self.page.bbox[2]
 
-        chars = sorted(self.page.crop(bbox).chars, key=lambda e: e['x0'])
+        chars = sorted(self.index.chars(bbox), key=lambda e: e['x0'])
         chars.insert(0, {'x0': bbox[0], 'x1': bbox[0], 'text': '_'})
 
         i=0
@@ -132,6 +162,29 @@ class TableFinder:
 
         return chars[-1]['x1']
 
+    def line_runs(self, lst, touching=True):
+        """
+        Split a list of lines, sorted by their distance to the top of the page, into runs of lines that are merged into one line. 
+        A line continues the run of the previous line, if both have the same top, the line ends further to the right and (with touching=True) starts before the previous line ends.
+        The decision only depends on the neighbouring lines, so the runs are found in one vectorized sweep.
+
+        Args:
+            lst (list): A list of dictionaries representing lines, sorted by top.
+            touching (bool): Whether the lines of a run have to touch or overlap.
+
+        Returns:
+            list: The (start, end) indices of every run, end is inclusive.
+        """
+        top = np.fromiter((x['top'] for x in lst), dtype=float, count=len(lst))
+        x0 = np.fromiter((x['x0'] for x in lst), dtype=float, count=len(lst))
+        x1 = np.fromiter((x['x1'] for x in lst), dtype=float, count=len(lst))
+
+        joined = (top[1:] == top[:-1]) & (x1[1:] > x1[:-1])
+        if touching: joined &= x0[1:] <= x1[:-1]
+
+        starts = np.flatnonzero(~joined) + 1
+        return list(zip([0] + starts.tolist(), (starts - 1).tolist() + [len(lst) - 1]))
+
     def concat_lines(self, lst):
         """
         Concatenate lines with the same distance to the top of the page.
@@ -145,25 +198,17 @@ class TableFinder:
         concat_line_segments = []
         if len(lst) == 0:
             return concat_line_segments
-        current_line = lst.pop(0)
 
-        for i, line in enumerate(lst):
-            if current_line['top'] == line['top'] and line['x1'] > current_line['x1'] and line['x0'] <= current_line['x1']:
-                current_line['x1'] = line['x1']
-                current_line['width'] = current_line['width'] + line['width']
-                current_line['pts'][1] = line['pts'][1]
+        for start, end in self.line_runs(lst, touching=True):
+            current_line = lst[start]
+            if end > start:
+                current_line['x1'] = lst[end]['x1']
+                current_line['width'] = sum((line['width'] for line in lst[start+1:end+1]), current_line['width'])
+                current_line['pts'][1] = lst[end]['pts'][1]
 
-            else:
-                if current_line['x0'] < self.page.bbox[0] or current_line['top'] < self.page.bbox[1]:
-                    current_line = line
-                    continue
-                concat_line_segments.append(current_line)
-                current_line = line
-
-        if current_line['x0'] < self.page.bbox[0] or current_line['top'] < self.page.bbox[1]:
-            return concat_line_segments
-
-        concat_line_segments.append(current_line) #append last line also to concat_lines
+            if current_line['x0'] < self.page.bbox[0] or current_line['top'] < self.page.bbox[1]:
+                continue
+            concat_line_segments.append(current_line)
 
         return concat_line_segments
     
@@ -180,22 +225,20 @@ class TableFinder:
         concat_lines = []
         if len(lst) == 0:
             return concat_lines
-        current_line = lst.pop(0)
-        current_line['segments'] = [current_line.copy()]
-
-        for line in lst:
-            if current_line['top'] == line['top'] and line['x1'] > current_line['x1']:
-                current_line['x1'] = line['x1']
-                current_line['pts'][1] = line['pts'][1]
-                current_line['segments'].append(line)
-            else:
-                current_line['width'] = current_line['segments'][-1]['x1'] - current_line['segments'][0]['x0'] if len(current_line['segments']) > 0 else current_line['segments'][0]['width']
-                concat_lines.append(current_line)
-                current_line = line
-                current_line['segments'] = [current_line.copy()]
-                
-        #append last line also to concat_lines
-        concat_lines.append(current_line) 
+
+        runs = self.line_runs(lst, touching=False)
+        for i, (start, end) in enumerate(runs):
+            current_line = lst[start]
+            current_line['segments'] = [current_line.copy()]
+            if end > start:
+                current_line['x1'] = lst[end]['x1']
+                current_line['pts'][1] = lst[end]['pts'][1]
+                current_line['segments'].extend(lst[start+1:end+1])
+
+            # the width of the last line is kept as it is
+            if i < len(runs)-1:
+                current_line['width'] = current_line['segments'][-1]['x1'] - current_line['segments'][0]['x0']
+            concat_lines.append(current_line)
 
         return concat_lines
     
@@ -220,119 +263,148 @@ class TableFinder:
 
         return lines
 
-    def find_lines_of_dots(self):
+    def find_lines_of_dots(self, jitter=0.5):
         """
         Finds and groups the lines of dots in the given page based on their y-coordinates and proximity in x-coordinates.
         Returns a list of dictionaries representing the lines of dots, each containing the x-coordinate range, top and bottom y-coordinates, width, height, and a flag indicating if it's a dot line.
+
+        The dots are sorted by their top (in page order for the same top), and a dot continues the run of the previous dot, if it starts less than 7 points after it.
+        Every run of more than 3 dots is a line, except the last run of the page.
+
+        Args:
+            jitter (float): Dots, whose top differs by no more than this value from the previous row, are treated as one row, so that a small jitter of the baseline does not split a line of dots. Default is 0.5. With 0, only dots with the same top form a row.
         """
         dots = [x for x in self.page.chars if x['text'] == '.']
-
-        dots_grouped_by_y = [list(group) for key, group in itertools.groupby(sorted(dots, key=lambda e: e['top']), lambda e: e['top'])]
+        if len(dots) == 0:
+            return []
+
+        top = np.fromiter((x['top'] for x in dots), dtype=float, count=len(dots))
+        order = np.argsort(top, kind='stable')
+        if jitter > 0:
+            # assign the tops to rows and keep the page order within a row
+            sorted_top = top[order]
+            rows = np.empty(len(dots), dtype=int)
+            rows[order] = np.cumsum(np.diff(sorted_top, prepend=sorted_top[0]) > jitter)
+            order = np.argsort(rows, kind='stable')
+
+        x0 = np.fromiter((dots[i]['x0'] for i in order), dtype=float, count=len(dots))
+        x1 = np.fromiter((dots[i]['x1'] for i in order), dtype=float, count=len(dots))
+
+        joined = (x1[:-1] < x0[1:]) & (x0[1:] < x1[:-1] + 7)
+        starts = np.concatenate(([0], np.flatnonzero(~joined) + 1))
+        ends = np.concatenate((starts[1:], [len(dots)]))
+
+        # the last run is never closed by a following dot
         lines = []
-        current_group = None
-        for dot_group in dots_grouped_by_y:
-            for dot in dot_group:
-                if current_group == None:
-                    current_group = [dot]
-                elif current_group[-1]['x1'] < dot['x0'] < current_group[-1]['x1'] + 7:
-                    current_group.append(dot)
-                else:
-                    if len(current_group) > 3:
-                        x0 = min(current_group, key=lambda e: e['x0'])['x0']
-                        x1 = max(current_group, key=lambda e: e['x1'])['x1']
-                        lines.append({'x0': x0, 'x1': x1, 'top': current_group[0]['bottom'], 'bottom': current_group[0]['bottom'], 'width': x1 - x0, 'height': 1, 'dot_line': True})
-                    current_group = [dot]
+        for start, end, line_x0, line_x1 in zip(starts[:-1].tolist(), ends[:-1].tolist(), np.minimum.reduceat(x0, starts).tolist(), np.maximum.reduceat(x1, starts).tolist()):
+            if end - start > 3:
+                bottom = dots[order[start]]['bottom']
+                lines.append({'x0': line_x0, 'x1': line_x1, 'top': bottom, 'bottom': bottom, 'width': line_x1 - line_x0, 'height': 1, 'dot_line': True})
 
         return lines
 
-    def derive_tables(self, bottom_threshold=10, top_threshold=10, left_threshold=5, right_threshold=5):
+    def merge_table(self, table, test_table, bottom_threshold=10, top_threshold=10, left_threshold=5, right_threshold=5):
         """
-        Look for overlapping tables and merge them into a single table.
+        Merge a table candidate into a table, if it overlaps with the table.
 
         Parameters:
-            self (object): The object instance.
-        
+            table (dict): The table, its bbox is extended in place.
+            test_table (dict): The candidate.
+
         Returns:
-            dict: The derived table.
+            bool: True if the candidate was merged, False if it lies next to the table.
         """
-        table = self.tables.pop(0)
-        derived_tables = []
-    
-        for i, test_table in enumerate(self.tables):
-            bbox = test_table['bbox']
-            table_bbox = table['bbox']
-
-            ll = bbox[0] + left_threshold < table_bbox[0] #bbox left side is on the left of the table
-            lr = bbox[2] + left_threshold < table_bbox[0] #bbox right side is on the left of the table
-            rr = bbox[2] - right_threshold > table_bbox[2] #bbox right side is on the right of the table
-            rl = bbox[0] - right_threshold > table_bbox[2] #bbox left side is on the right of the table
-            tt = bbox[1] + top_threshold < table_bbox[1] #bbox top side is on top of the table
-            tb = bbox[3] + top_threshold < table_bbox[1] #bbox bottom side is on top of the table
-            bb = bbox[3] - bottom_threshold > table_bbox[3] #bbox bottom side is below the table
-            bt = bbox[1] - bottom_threshold > table_bbox[3] #bbox top side is below the table
-
-            l_inside = not (ll or rl)
-            r_inside = not (lr or rr)
-            b_inside = not (tb or bb)
-            t_inside = not (tt or bt)
-            
-            if ll and rr and tt and bb: # table is inside bbox
-                table_bbox = bbox
-                table['lines'].insert(0, test_table['lines'][0])
-            elif (ll and lr) or (rr and rl) or (tt and tb) or (bb and bt): # bbox is next to the table
-                derived_tables.append(test_table)
-            elif l_inside and r_inside and t_inside and b_inside: # bbox is inside of the table
-                table['lines'].append(test_table['lines'][0])
-            else:
-                if l_inside and rr: # bbox right side is on the right of the table -> extend right
-                    if len(test_table['lines']) > 0: 
-                        table['lines'].append(test_table['lines'][0])
-                    table_bbox[2] = bbox[2] 
-                    if b_inside and tt: # bbox top side is on top of the table -> extend top
-                        table_bbox[1] = bbox[1] 
-                    elif t_inside and bb: # bbox bottom side is below the table -> extend bottom
-                        table_bbox[3] = bbox[3] 
-                elif r_inside and ll: # bbox left side is on the left of the table -> extend left
-                    if len(test_table['lines']) > 0: 
-                        table['lines'].append(test_table['lines'][0])
-                    table_bbox[0] = bbox[0] 
-                    if b_inside and tt: # bbox top side is on top of the table -> extend top
-                        table_bbox[1] = bbox[1] 
-                    elif t_inside and bb: # bbox bottom side is below the table -> extend bottom
-                        table_bbox[3] = bbox[3] 
-                elif b_inside and tt: # bbox top side is on top of the table -> extend top
-                    if len(test_table['lines']) > 0: 
-                        table['lines'].append(test_table['lines'][0])
+        bbox = test_table['bbox']
+        table_bbox = table['bbox']
+
+        ll = bbox[0] + left_threshold < table_bbox[0] #bbox left side is on the left of the table
+        lr = bbox[2] + left_threshold < table_bbox[0] #bbox right side is on the left of the table
+        rr = bbox[2] - right_threshold > table_bbox[2] #bbox right side is on the right of the table
+        rl = bbox[0] - right_threshold > table_bbox[2] #bbox left side is on the right of the table
+        tt = bbox[1] + top_threshold < table_bbox[1] #bbox top side is on top of the table
+        tb = bbox[3] + top_threshold < table_bbox[1] #bbox bottom side is on top of the table
+        bb = bbox[3] - bottom_threshold > table_bbox[3] #bbox bottom side is below the table
+        bt = bbox[1] - bottom_threshold > table_bbox[3] #bbox top side is below the table
+
+        l_inside = not (ll or rl)
+        r_inside = not (lr or rr)
+        b_inside = not (tb or bb)
+        t_inside = not (tt or bt)
+        
+        if ll and rr and tt and bb: # table is inside bbox (the bbox of the table is kept)
+            table['lines'].insert(0, test_table['lines'][0])
+        elif (ll and lr) or (rr and rl) or (tt and tb) or (bb and bt): # bbox is next to the table
+            return False
+        elif l_inside and r_inside and t_inside and b_inside: # bbox is inside of the table
+            table['lines'].append(test_table['lines'][0])
+        else:
+            if l_inside and rr: # bbox right side is on the right of the table -> extend right
+                if len(test_table['lines']) > 0: 
+                    table['lines'].append(test_table['lines'][0])
+                table_bbox[2] = bbox[2] 
+                if b_inside and tt: # bbox top side is on top of the table -> extend top
                     table_bbox[1] = bbox[1] 
                 elif t_inside and bb: # bbox bottom side is below the table -> extend bottom
-                    if len(test_table['lines']) > 0: 
-                        table['lines'].append(test_table['lines'][0])
                     table_bbox[3] = bbox[3] 
-                elif l_inside and r_inside: # bbox is between left and right of the table
-                    if len(test_table['lines']) > 0: 
-                        table['lines'].append(test_table['lines'][0])
-                    if tt:
-                        table_bbox[1] = bbox[1]
-                    if bb:
-                        table_bbox[3] = bbox[3]
-                elif b_inside and t_inside: # bbox is between top and bottom of the table
-                    if len(test_table['lines']) > 0: 
-                        table['lines'].append(test_table['lines'][0])
-                    if rr:
-                        table_bbox[2] = bbox[2]
-                    if ll: 
-                        table_bbox[0] = bbox[0]
-
-                if tt and bb:
+            elif r_inside and ll: # bbox left side is on the left of the table -> extend left
+                if len(test_table['lines']) > 0: 
+                    table['lines'].append(test_table['lines'][0])
+                table_bbox[0] = bbox[0] 
+                if b_inside and tt: # bbox top side is on top of the table -> extend top
+                    table_bbox[1] = bbox[1] 
+                elif t_inside and bb: # bbox bottom side is below the table -> extend bottom
+                    table_bbox[3] = bbox[3] 
+            elif b_inside and tt: # bbox top side is on top of the table -> extend top
+                if len(test_table['lines']) > 0: 
+                    table['lines'].append(test_table['lines'][0])
+                table_bbox[1] = bbox[1] 
+            elif t_inside and bb: # bbox bottom side is below the table -> extend bottom
+                if len(test_table['lines']) > 0: 
+                    table['lines'].append(test_table['lines'][0])
+                table_bbox[3] = bbox[3] 
+            elif l_inside and r_inside: # bbox is between left and right of the table
+                if len(test_table['lines']) > 0: 
+                    table['lines'].append(test_table['lines'][0])
+                if tt:
                     table_bbox[1] = bbox[1]
+                if bb:
                     table_bbox[3] = bbox[3]
-
-                if rr and ll:
-                    table_bbox[0] = bbox[0]
+            elif b_inside and t_inside: # bbox is between top and bottom of the table
+                if len(test_table['lines']) > 0: 
+                    table['lines'].append(test_table['lines'][0])
+                if rr:
                     table_bbox[2] = bbox[2]
+                if ll: 
+                    table_bbox[0] = bbox[0]
+
+            if tt and bb:
+                table_bbox[1] = bbox[1]
+                table_bbox[3] = bbox[3]
+
+            if rr and ll:
+                table_bbox[0] = bbox[0]
+                table_bbox[2] = bbox[2]
+
+        return True
+
+    def derive_tables(self, bottom_threshold=10, top_threshold=10, left_threshold=5, right_threshold=5):
+        """
+        Look for overlapping tables and merge them. In one pass over the candidates, every candidate is merged into the first derived table it is not next to, 
+        or starts a new table. This equals merging all candidates into the first one, and repeating that with the candidates that were left.
+
+        Parameters:
+            self (object): The object instance.
+        
+        Returns:
+            list: The derived tables.
+        """
+        derived_tables = []
+        for test_table in self.tables:
+            if not any(self.merge_table(table, test_table, bottom_threshold, top_threshold, left_threshold, right_threshold) for table in derived_tables):
+                derived_tables.append(test_table)
 
         self.tables = derived_tables
-        return table
+        return derived_tables
 
     def extend_table(self, bbox, bottom_threshold=5, top_threshold=4, left_threshold=5, right_threshold=2):
         """
@@ -350,10 +422,10 @@ class TableFinder:
         """
         bbox_old = bbox
         while True:
-            bottom = self.find_table_bottom([bbox[0], bbox[3], bbox[2], self.page.bbox[3]], bottom_threshold)
-            top = self.find_table_top([bbox[0], self.page.bbox[1], bbox[2], bbox[1]], top_threshold, must_contain_chars=False)
-            left = self.find_table_left([self.page.bbox[0], top, bbox[0], bottom], left_threshold)
-            right = self.find_table_right([bbox[2], top, self.page.bbox[2], bottom], right_threshold)
+            bottom = self.boundary(self.find_table_bottom, [bbox[0], bbox[3], bbox[2], self.page.bbox[3]], bottom_threshold)
+            top = self.boundary(self.find_table_top, [bbox[0], self.page.bbox[1], bbox[2], bbox[1]], top_threshold, False)
+            left = self.boundary(self.find_table_left, [self.page.bbox[0], top, bbox[0], bottom], left_threshold)
+            right = self.boundary(self.find_table_right, [bbox[2], top, self.page.bbox[2], bottom], right_threshold)
 
             bbox = [left, top, right, bottom]
 
@@ -390,15 +462,46 @@ class TableFinder:
         Returns:
             bool: True if the table lies in one column, False otherwise.
         """
-        objs = self.page.crop([mid, top if top > self.page.bbox[1] else self.page.bbox[1], mid+3, bottom if bottom < self.page.bbox[3] else self.page.bbox[3]], strict=False)
-        objs = objs.chars + [x for x in objs.lines if x['fill'] == True] + objs.rects
+        strip = self.index.strip(mid, mid+3)
+        count = strip.count(top if top > self.page.bbox[1] else self.page.bbox[1], bottom if bottom < self.page.bbox[3] else self.page.bbox[3])
 
-        mid_chars = self.page.crop([mid, self.page.bbox[1], mid+3, self.page.bbox[3]], strict=False).chars
-        sum_height = sum(x['height'] for x in mid_chars)
-
-        return len(objs) > 1 or sum_height > self.page.height * 0.3
+        return count > 1 or strip.height > self.page.height * 0.3
             
-    def find_tables(self, bottom_threshold=5, top_threshold=4, left_threshold=2, right_threshold=2, detection_method='rule-based', image=None):
+    def uncertain(self, tables, min_numeric_rows=3, min_digits=6, numeric_share=0.5, min_lines=2):
+        """
+        Check if the result of the rule-based detection is uncertain, so that the page should be passed to the detection model. That is the case for:
+        + numeric-dense text rows outside of the found tables, e.g. of a table without ruling lines
+        + a table that is bounded by fewer than min_lines ruling lines, its bbox is mostly a guess
+
+        Args:
+            tables (list): The derived tables of the rule-based detection.
+            min_numeric_rows (int): Minimum number of numeric rows outside of the tables. Default is 3.
+            min_digits (int): Minimum number of digits in a numeric row, so that page numbers or single years do not count. Default is 6.
+            numeric_share (float): Minimum share of digits in the chars of a numeric row. Default is 0.5.
+            min_lines (int): Minimum number of ruling lines of a table with a confident bbox. Default is 2.
+
+        Returns:
+            bool: True if the page is uncertain.
+        """
+        if any(len(table['lines']) < min_lines for table in tables):
+            return True
+
+        char_table = self.index.char_table()
+        mask = char_table.mask(self.page.bbox)
+        for table in tables:
+            x0, top, x1, bottom = table['bbox']
+            mask &= ~((char_table.x0 >= x0) & (char_table.x1 <= x1) & (char_table.top >= top) & (char_table.bottom <= bottom))
+        if not mask.any():
+            return False
+
+        # group the remaining chars to rows and count the digits of every row
+        _, rows = np.unique(np.round(char_table.top[mask]), return_inverse=True)
+        chars = np.bincount(rows)
+        digits = np.bincount(rows, weights=char_table.digit[mask])
+        numeric_rows = (digits >= min_digits) & (digits >= chars * numeric_share)
+        return int(numeric_rows.sum()) >= min_numeric_rows
+
+    def find_tables(self, bottom_threshold=5, top_threshold=4, left_threshold=2, right_threshold=2, detection_method='rule-based', image=None, detections=None, render=None):
         """
         Finds tables in the given document based on certain thresholds.
         
@@ -407,6 +510,10 @@ class TableFinder:
             top_threshold (int): The threshold for the top position of a table. Default is 4.
             left_threshold (int): The threshold for the left position of a table. Default is 2.
             right_threshold (int): The threshold for the right position of a table. Default is 2.
+            detection_method (str): Either 'rule-based', 'model-based' or 'hybrid'. The hybrid detection runs the rule-based detection and passes only uncertain pages (see uncertain) to the model, self.escalated tells if the page was passed.
+            image (PageImage): The rendered page for the model-based detection.
+            detections (dict): Precomputed model detections of the page (see BatchInference). If provided, the model is not run again.
+            render (function): Renders the page for the model, if the hybrid detection escalates the page and neither an image nor detections are given.
         
         Returns:
             list: A list of derived tables found in the document.
@@ -416,13 +523,14 @@ class TableFinder:
         self.lines.sort(key = lambda e: e['top'])
         line_segments = self.concat_lines(self.lines)
         self.lines = self.concat_line_segments(line_segments)
+        self.index.refresh('line') # the lines of the page have been changed in place
 
-        chars = sorted([x for x in self.page.chars if x['matrix'][1] == 0 and x['matrix'][2] == 0 and x['text'] != ' ' and x['x0'] >= self.page.bbox[0] and x['x1'] <= self.page.bbox[2]], key=lambda e: e['x0'])
+        char_table = self.index.char_table()
+        chars = char_table.select(char_table.mask([self.page.bbox[0], None, self.page.bbox[2], None]))
 
         # look for characters in the middle of the page -> one column page layout
         mid = (chars[0]['x0'] + chars[-1]['x1'])/2
-        mid_chars = self.page.crop([mid, self.page.bbox[1], mid+3, self.page.bbox[3]], strict=False).chars
-        two_column = sum(x['height'] for x in mid_chars) < self.page.height * 0.05
+        two_column = self.index.strip(mid, mid+3).height < self.page.height * 0.05
         if two_column:
             self.lines = [x for x in self.lines if x['width'] < (chars[-1]['x1'] - chars[0]['x0']) * 0.5]
 
@@ -430,7 +538,7 @@ class TableFinder:
         all_lines = self.find_lines_of_dots() + self.lines
         all_lines.sort(key = lambda e: e['top'])
 
-        if detection_method == 'rule-based':
+        if detection_method in ['rule-based', 'hybrid']:
             bottom_threshold = self.line_threshold()
 
             # find a bbox for each line
@@ -438,18 +546,17 @@ class TableFinder:
                 if line['x0'] >= line['x1']:
                     continue
                 
-                bottom = self.find_table_bottom([line['x0'], line['top'], line['x1'], self.page.bbox[3]], bottom_threshold)
-                top = self.find_table_top([line['x0'], self.page.bbox[1], line['x1'], line['bottom']], top_threshold, must_contain_chars=True)
+                bottom = self.boundary(self.find_table_bottom, [line['x0'], line['top'], line['x1'], self.page.bbox[3]], bottom_threshold)
+                top = self.boundary(self.find_table_top, [line['x0'], self.page.bbox[1], line['x1'], line['bottom']], top_threshold, True)
 
                 if top >= bottom:
                     continue
 
                 if not two_column or self.one_column_layout(top-top_threshold, bottom+bottom_threshold, mid):
-                    chars = sorted([x for x in self.page.chars if x['matrix'][1] == 0 and x['matrix'][2] == 0 and x['text'] != ' ' and x['x0'] >= self.page.bbox[0] and x['x1'] <= self.page.bbox[2]], key=lambda e: e['x0'])
                     left, right = chars[0]['x0'], chars[-1]['x1']
                 else: 
-                    left = self.find_table_left([self.page.bbox[0], top, line['x0'], bottom], left_threshold)
-                    right = self.find_table_right([line['x1'], top, self.page.bbox[2], bottom], right_threshold)
+                    left = self.boundary(self.find_table_left, [self.page.bbox[0], top, line['x0'], bottom], left_threshold)
+                    right = self.boundary(self.find_table_right, [line['x1'], top, self.page.bbox[2], bottom], right_threshold)
 
                 bbox = self.extend_table([left, top, right, bottom])
 
@@ -457,21 +564,28 @@ class TableFinder:
 
                 self.tables.append(table)
 
-        elif detection_method == 'model-based' and self.model is not None and image is not None and self.image_processor is not None:
-            inputs = self.image_processor(images=image.original, return_tensors="pt")
-            outputs = self.model(**inputs)
-
-            # convert outputs (bounding boxes and class logits) to Pascal VOC format (xmin, ymin, xmax, ymax)
-            target_sizes = torch.tensor([image.original.size[::-1]])
-            results = self.image_processor.post_process_object_detection(outputs, threshold=0.5, target_sizes=target_sizes)[0]
+        rule_based_tables = None
+        if detection_method == 'hybrid':
+            rule_based_tables = self.derive_tables()
+            model_available = detections is not None or (self.model is not None and self.image_processor is not None and (image is not None or render is not None))
+            if model_available and self.uncertain(rule_based_tables):
+                self.escalated = True
+                self.tables = []
+                rule_based_tables = None
+                if detections is None and image is None: image = render()
+                detection_method = 'model-based'
+
+        if detection_method == 'model-based' and (detections is not None or (self.model is not None and image is not None and self.image_processor is not None)):
+            if detections is None:
+                detections = BatchInference(self.model, self.image_processor).run([image])[0]
 
             boxes = []
             #derived_tables = []
-            for score, label, box in zip(results["scores"], results["labels"], results["boxes"]):
-                bbox = [round(i/image.scale, 2) for i in box.tolist()] # reorder and scale
+            for score, label, box in zip(detections["scores"], detections["labels"], detections["boxes"]):
+                bbox = [round(i/detections['scale'], 2) for i in box] # reorder and scale
                 bbox = self.extend_table(top_threshold=2, bottom_threshold=2, bbox=bbox) # extend
 
-                chars = self.page.crop(bbox).chars
+                chars = self.index.chars(bbox)
                 if len(chars) == 0:
                     continue
 
@@ -488,23 +602,10 @@ class TableFinder:
             derived_tables = self.tables     
         
         # merge the bounding boxes
-        derived_tables = []
-        if (len(self.tables)>0):
-            while True:
-                new_table = self.derive_tables()
-                new_table['footer'] = new_table['bbox'][3]
-                new_table['header'] = new_table['bbox'][1]
-                derived_tables.append(new_table)
-                if len(self.tables) == 0:
-                    break
-                if len(self.tables) == 1:
-                    new_table = self.tables.pop(0)
-                    new_table['footer'] = new_table['bbox'][3]
-                    new_table['header'] = new_table['bbox'][1]
-                    derived_tables.append(new_table)
-                    break
-        
-            self.tables = derived_tables
+        derived_tables = self.derive_tables() if rule_based_tables is None else rule_based_tables
+        for table in derived_tables:
+            table['footer'] = table['bbox'][3]
+            table['header'] = table['bbox'][1]
             
         # Make sure that all the lines are within the table
         for t in derived_tables:
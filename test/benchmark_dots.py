@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+import __init__
+from src.table_finder import TableFinder
+from benchmark_speed import getPdfPaths, synthetic_pdfs
+
+import argparse
+import itertools
+import os
+import tempfile
+import time
+import pdfplumber
+
+class LoopTableFinder(TableFinder):
+    """
+    Reference implementation of the dot line detection with the original loop over the dots.
+    """
+    def find_lines_of_dots(self):
+        dots = [x for x in self.page.chars if x['text'] == '.']
+
+        dots_grouped_by_y = [list(group) for key, group in itertools.groupby(sorted(dots, key=lambda e: e['top']), lambda e: e['top'])]
+        lines = []
+        current_group = None
+        for dot_group in dots_grouped_by_y:
+            for dot in dot_group:
+                if current_group == None:
+                    current_group = [dot]
+                elif current_group[-1]['x1'] < dot['x0'] < current_group[-1]['x1'] + 7:
+                    current_group.append(dot)
+                else:
+                    if len(current_group) > 3:
+                        x0 = min(current_group, key=lambda e: e['x0'])['x0']
+                        x1 = max(current_group, key=lambda e: e['x1'])['x1']
+                        lines.append({'x0': x0, 'x1': x1, 'top': current_group[0]['bottom'], 'bottom': current_group[0]['bottom'], 'width': x1 - x0, 'height': 1, 'dot_line': True})
+                    current_group = [dot]
+
+        return lines
+
+def run(pages, cls, repeat):
+    """
+    Find the dot lines of every page and measure the fastest of several runs.
+    """
+    results = []
+    total = 0
+    for page in pages:
+        tf = cls(page)
+        timings = []
+        for _ in range(repeat):
+            s0 = time.perf_counter()
+            lines = tf.find_lines_of_dots()
+            timings.append(time.perf_counter() - s0)
+        total += min(timings)
+        results.append(lines)
+    return results, total
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare the vectorized dot line detection with the original loop.")
+    parser.add_argument("path", nargs="?", help="Path to pdf file or directory containing pdf files", default="examples/pdf")
+    parser.add_argument("--stress_pages", type=int, help="Number of synthetic pages with dot leaders. Default is 5.", default=5)
+    parser.add_argument("--repeat", type=int, help="Number of runs per page. Default is 20.", default=20)
+    args = parser.parse_args()
+
+    pdf_paths = getPdfPaths(args.path) if os.path.isdir(args.path) else [args.path]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        suites = {'corpus': pdf_paths, 'dot leaders': [x for x in synthetic_pdfs(tmp, args.stress_pages) if 'dot_leaders' in x]}
+        for name, paths in suites.items():
+            pages = [page for path in paths for page in pdfplumber.open(path).pages]
+            for page in pages: page.chars # parse the pages before the measurement
+
+            loop_results, loop_time = run(pages, LoopTableFinder, args.repeat)
+            vector_results, vector_time = run(pages, TableFinder, args.repeat)
+            identical = sum(a == b for a, b in zip(loop_results, vector_results))
+
+            print(f"{name}:\t{len(pages)} pages\t{sum(len(x) for x in loop_results)} dot lines\tloop {round(loop_time*1000, 2)} ms\tvectorized {round(vector_time*1000, 2)} ms\tspeedup {round(loop_time/max(vector_time, 1e-9), 2)}x\tidentical {identical}/{len(pages)}")
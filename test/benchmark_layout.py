@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+import __init__
+import src.table_extractor as table_extractor
+from src.layout_extractor import LayoutExtractor
+
+import argparse
+import os
+import time
+from collections import defaultdict
+
+def getPdfPaths(path):
+    pdfs = []
+    for root, dirs, files in os.walk(path):
+        for file in files:
+            if file.endswith(".pdf"):
+                pdfs.append(os.path.join(root, file))
+    return sorted(pdfs)
+
+class LoopLayoutExtractor(LayoutExtractor):
+    """
+    Reference implementation of the column and row detection with the original char-by-char loops.
+    """
+    def find_columns(self, clipping, max_diff, special_symbols=[' ', '.', '\n', '\t'], font_diff=True, after_symbols=['%'], before_symbols=['$', '€', '¥', '£', '₤']):
+        chars = [char for char in sorted(clipping.chars, key=lambda e: e['x0']) if char['text']  not in special_symbols]
+        separator = []
+
+        for i in range(len(chars)-1):
+            char = chars[i]
+            next_char = chars[i+1]
+            diff = next_char['x0'] - char['x1']
+
+            if (char['text'] in before_symbols and next_char['text'] not in before_symbols or
+                (next_char['text'] in after_symbols and char['text'] not in after_symbols) or
+                char['text'] == '-' or next_char['text'] == '-'):
+                continue
+
+            if (diff > max_diff or (font_diff and diff > 3 and next_char['fontname'] != char['fontname']) or
+                (diff > 1 and next_char['text'] in before_symbols and char['text'] not in before_symbols) or
+                (diff > 1 and char['text'] in after_symbols and next_char['text'] not in after_symbols)):
+
+                separator_x = next_char['x0']-(diff/2)
+                bottom = clipping.bbox[3]
+                top = self.extend_top_of_column(separator_x, clipping.bbox[1], clipping.bbox[3])
+                separator.append({'x0': separator_x, 'top': top, 'x1': separator_x, 'bottom': bottom, 'object_type': 'line', 'height': bottom-top})
+
+        return separator
+
+    def find_rows(self, clipping, max_diff):
+        chars = [char for char in sorted(clipping.chars, key=lambda e: e['top']) if char['text'] not in [' ', '\n', '\t']]
+        separator = []
+        header_separator = None
+        i=0
+        while i < len(chars)-1:
+            diff = chars[i+1]['top'] - chars[i]['bottom']
+            avg = (chars[i]['bottom'] + chars[i+1]['top']) / 2
+
+            if diff > max_diff:
+                left = self.table['bbox'][0]
+                right = self.table['bbox'][2]
+                line = {'x0': left, 'top': avg, 'x1': right, 'bottom': avg, 'object_type': 'line', 'width': right-left}
+                separator.append(line)
+
+                if chars[i+1]['fontname'] != chars[i]['fontname'] and header_separator is None:
+                    header_separator = avg
+
+            i += 1
+
+        table_percentage = clipping.height/self.page_height
+        if header_separator is None or header_separator - clipping.bbox[1] > clipping.height * (1-table_percentage)*0.9 > 1:
+            header_separator = sorted([x for x in self.table_lines if "dot_line" not in x.keys()
+                                                                and x['top'] - clipping.bbox[1] > clipping.height * 0.01
+                                                                and x['bottom'] - clipping.bbox[1] < clipping.height * (1-table_percentage) * 0.9
+                                                                and x['width'] > clipping.width * 0.3],
+                                                                key=lambda e: e['width'], reverse=True)
+            if len(header_separator) == 0 or header_separator[0]['width'] < clipping.width * 0.3:
+                header_separator = clipping.bbox[1]
+            else:
+                header_separator = max([x for x in header_separator if x['width'] == header_separator[0]['width']], key=lambda e: len(e['segments']))['top']
+
+        return separator, header_separator
+
+def timed(cls, timings):
+    """
+    Derive a layout extractor class, that records the time spent in find_columns and find_rows.
+    """
+    class TimedLayoutExtractor(cls):
+        def find_columns(self, *args, **kwargs):
+            s0 = time.perf_counter()
+            result = super().find_columns(*args, **kwargs)
+            timings['find_columns'] += time.perf_counter() - s0
+            return result
+
+        def find_rows(self, *args, **kwargs):
+            s0 = time.perf_counter()
+            result = super().find_rows(*args, **kwargs)
+            timings['find_rows'] += time.perf_counter() - s0
+            return result
+
+    return TimedLayoutExtractor
+
+def run(pdf_paths, cls, max_column_space, max_row_space):
+    timings = defaultdict(float)
+    table_extractor.LayoutExtractor = timed(cls, timings)
+    results = {}
+    for path in pdf_paths:
+        te = table_extractor.TableExtractor(path=path, max_column_space=max_column_space, max_row_space=max_row_space)
+        results[path] = [(t['bbox'], t['header'], t['footer'], t['settings'], [c['text'] for c in t['cells']]) for t in te.extractTables()]
+    table_extractor.LayoutExtractor = LayoutExtractor
+    return results, timings
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare the vectorized column/row detection with the original loops.")
+    parser.add_argument("path", nargs="?", help="Path to pdf file or directory containing pdf files", default="examples/pdf")
+    parser.add_argument("--max_charspace", type=float, default=5)
+    parser.add_argument("--max_linespace", type=float, default=-0.3)
+    args = parser.parse_args()
+
+    pdf_paths = getPdfPaths(args.path) if os.path.isdir(args.path) else [args.path]
+
+    loop_results, loop_timings = run(pdf_paths, LoopLayoutExtractor, args.max_charspace, args.max_linespace)
+    vector_results, vector_timings = run(pdf_paths, LayoutExtractor, args.max_charspace, args.max_linespace)
+
+    mismatches = [path for path in pdf_paths if loop_results[path] != vector_results[path]]
+
+    print(f"Number of pdfs:\t{len(pdf_paths)}")
+    for name in ['find_columns', 'find_rows']:
+        print(f"{name}:\tloop {round(loop_timings[name], 3)} s\tvectorized {round(vector_timings[name], 3)} s\tspeedup {round(loop_timings[name]/max(vector_timings[name], 1e-9), 2)}x")
+    print(f"Identical results:\t{len(pdf_paths)-len(mismatches)}/{len(pdf_paths)}")
+    for path in mismatches: print(f"Mismatch in {path}")
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+import __init__
+from src.table_extractor import TableExtractor
+from src.memory import peak_rss
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import numpy as np
+
+# lower is better for every metric except the throughput
+HIGHER_IS_BETTER = ['pages_per_s']
+METRICS = ['pages_per_s', 'p50', 'p95', 'p99', 'detection', 'layout', 'export']
+LAYOUT_STAGES = ['find_layout', 'find_model_layout', 'find_table', 'merge_cells', 'cells']
+
+def getPdfPaths(path):
+    pdfs = []
+    for root, dirs, files in os.walk(path):
+        for file in files:
+            if file.endswith(".pdf"):
+                pdfs.append(os.path.join(root, file))
+    return sorted(pdfs)
+
+def write_pdf(path, streams, width=612, height=792):
+    """
+    Write a minimal pdf with one page per content stream, using the standard Helvetica font.
+    """
+    objects = ['<< /Type /Catalog /Pages 2 0 R >>', None, '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for stream in streams:
+        objects.append(f'<< /Length {len(stream)} >>\nstream\n{stream}\nendstream')
+        objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width} {height}] /Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>')
+        kids.append(f'{len(objects)} 0 R')
+    objects[1] = f'<< /Type /Pages /Kids [{" ".join(kids)}] /Count {len(kids)} >>'
+
+    data = b'%PDF-1.4\n'
+    offsets = []
+    for i, obj in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += f'{i} 0 obj\n{obj}\nendobj\n'.encode('latin-1')
+    xref = len(data)
+    data += f'xref\n0 {len(objects)+1}\n0000000000 65535 f \n'.encode()
+    data += ''.join(f'{offset:010d} 00000 n \n' for offset in offsets).encode()
+    data += f'trailer\n<< /Size {len(objects)+1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode()
+
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def text(x, y, string, size=8):
+    return f'BT /F1 {size} Tf {x:.2f} {y:.2f} Td ({string}) Tj ET'
+
+def line(x0, y0, x1, y1, width=0.5):
+    return f'{width} w {x0:.2f} {y0:.2f} m {x1:.2f} {y1:.2f} l S'
+
+def number(rng):
+    return f'{rng.randint(1, 999)},{rng.randint(0, 999):03d}'
+
+def ruling_fragments_page(rng, rows=30, columns=6, fragment=3):
+    """
+    A ruled table, whose horizontal and vertical lines consist of many short fragments.
+    """
+    left, right, top, height = 60, 550, 720, 20
+    ops = [text(left, top + 20, 'Consolidated statement with fragmented rulings', 10)]
+    for row in range(rows+1):
+        y = top - row * height
+        ops.extend(line(x, y, x + fragment, y) for x in range(left, right, fragment))
+    for column in range(columns+1):
+        x = left + column * (right - left) / columns
+        ops.extend(line(x, y, x, y - fragment) for y in range(top, top - rows * height, -fragment))
+    for row in range(rows):
+        ops.append(text(left + 4, top - row * height - 14, f'Line item {row}'))
+        ops.extend(text(left + column * (right - left) / columns + 20, top - row * height - 14, number(rng)) for column in range(1, columns))
+    return '\n'.join(ops)
+
+def dot_leaders_page(rng, rows=40):
+    """
+    A table of contents like table with dot leaders between the labels and the numbers.
+    """
+    top, height = 720, 16
+    ops = [text(60, top + 20, 'Notes to the financial statements', 10)]
+    for row in range(rows):
+        y = top - row * height
+        label = f'Note {row} ' + 'x' * rng.randint(3, 20)
+        ops.append(text(60, y, label))
+        ops.append(text(60 + 5 * len(label), y, ' .' * ((400 - 5 * len(label)) // 4)))
+        ops.append(text(440, y, number(rng)))
+        ops.append(text(510, y, number(rng)))
+    return '\n'.join(ops)
+
+def numeric_grid_page(rng, rows=55, columns=10):
+    """
+    A dense grid of numbers without any rulings.
+    """
+    top, height, width = 740, 12.5, 50
+    ops = [text(40 + column * width, top + 14, f'FY {2000 + column}', 7) for column in range(columns)]
+    for row in range(rows):
+        ops.extend(text(40 + column * width, top - row * height, number(rng), 7) for column in range(columns))
+    return '\n'.join(ops)
+
+def synthetic_pdfs(directory, pages=2, seed=0):
+    """
+    Write the synthetic stress documents to a directory.
+
+    Returns:
+        list: The paths of the pdf files.
+    """
+    rng = random.Random(seed)
+    paths = []
+    for name, generator in [('ruling_fragments', ruling_fragments_page), ('dot_leaders', dot_leaders_page), ('numeric_grid', numeric_grid_page)]:
+        path = os.path.join(directory, f'{name}.pdf')
+        write_pdf(path, [generator(rng) for _ in range(pages)])
+        paths.append(path)
+    return paths
+
+def run(pdf_paths, export_path, max_column_space, max_row_space):
+    """
+    Extract and export every page of the given documents.
+
+    Returns:
+        tuple: The latency of every page and the time spent in the detection, the layout and the export.
+    """
+    latencies = []
+    stages = {'detection': 0.0, 'layout': 0.0, 'export': 0.0}
+    for path in pdf_paths:
+        with TableExtractor(path=path, max_column_space=max_column_space, max_row_space=max_row_space, profile=True) as te:
+            for i in range(len(te.pages)):
+                s0 = time.perf_counter()
+                tables = te.extractTablesInPage(i)
+                te.releasePage(i)
+                s1 = time.perf_counter()
+                for j, table in enumerate(tables):
+                    te.export('csv', f'{export_path}/{os.path.basename(path)[:-4]}_{i}_{j}', table=table, overwrite=True)
+                s2 = time.perf_counter()
+
+                latencies.append(s2 - s0)
+                stages['export'] += s2 - s1
+
+            for row in te.profile.report():
+                if row['stage'] == 'find_tables': stages['detection'] += row['time']
+                elif row['stage'] in LAYOUT_STAGES: stages['layout'] += row['time']
+
+    return latencies, stages
+
+def measure(pdf_paths, export_path, args):
+    """
+    Get the metrics of a set of documents. With several repetitions, the median run (by the total time of the pages) is used as a whole.
+    """
+    runs = [run(pdf_paths, export_path, args.max_charspace, args.max_linespace) for _ in range(args.repeat)]
+    latencies, stages = sorted(runs, key=lambda x: sum(x[0]))[len(runs) // 2]
+    latencies = np.array(latencies)
+
+    return {'pages': len(latencies),
+            'pages_per_s': len(latencies) / latencies.sum(),
+            'p50': float(np.percentile(latencies, 50)),
+            'p95': float(np.percentile(latencies, 95)),
+            'p99': float(np.percentile(latencies, 99)),
+            **stages}
+
+def compare(results, baseline, max_regression, min_delta=0.05, verbose=True):
+    """
+    Compare the results with a baseline.
+
+    Args:
+        results (dict): The current results.
+        baseline (dict): The results of the baseline.
+        max_regression (float): Maximum regression of a metric in percent.
+        min_delta (float): Minimum absolute regression in seconds. Smaller changes are measurement noise, even if they exceed max_regression. Only matters for metrics below min_delta / max_regression * 100 seconds, e.g. the export of a few tables.
+        verbose (bool): Print the table of the metrics.
+
+    Returns:
+        list: The metrics, that regressed by more than max_regression percent and min_delta seconds.
+    """
+    regressions = []
+    if verbose: print(f"\n{'metric':<28}{'baseline':>12}{'current':>12}{'change':>10}")
+    for suite in ['corpus', 'synthetic']:
+        for metric in METRICS:
+            if suite not in baseline or metric not in baseline[suite]: continue
+            old, new = baseline[suite][metric], results[suite][metric]
+            if metric in HIGHER_IS_BETTER:
+                change = (old - new) / old * 100
+                # the throughput is compared by the total time of the pages
+                delta = results[suite]['pages'] / new - baseline[suite]['pages'] / old
+            else:
+                change = (new - old) / old * 100
+                delta = new - old
+            if verbose: print(f"{suite + ' ' + metric:<28}{old:>12.4f}{new:>12.4f}{change:>9.1f}%")
+            if change > max_regression and delta > min_delta: regressions.append(f'{suite} {metric}')
+
+    if 'peak_rss' in baseline:
+        change = (results['peak_rss'] - baseline['peak_rss']) / baseline['peak_rss'] * 100
+        if verbose: print(f"{'peak_rss (MB)':<28}{baseline['peak_rss']:>12.1f}{results['peak_rss']:>12.1f}{change:>9.1f}%")
+        if change > max_regression: regressions.append('peak_rss')
+
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure the throughput and page latency of the rule-based extraction and compare it with a baseline.")
+    parser.add_argument("path", nargs="?", help="Path to pdf file or directory containing pdf files", default="examples/pdf")
+    parser.add_argument("--stress_pages", type=int, help="Number of pages of every synthetic stress document (ruling fragments, dot leaders, numeric grid). Default is 2.", default=2)
+    parser.add_argument("--repeat", type=int, help="Number of runs. The median run is used. Default is 1.", default=1)
+    parser.add_argument("--max_charspace", type=float, default=5)
+    parser.add_argument("--max_linespace", type=float, default=-0.3)
+    parser.add_argument("--baseline", help="Baseline json to compare the results with.", default=None)
+    parser.add_argument("--save", help="Save the results as json, e.g. as a new baseline.", default=None)
+    parser.add_argument("--max_regression", type=float, help="Fail, if a metric is worse than the baseline by more than this percentage. Default is 10.", default=10)
+    parser.add_argument("--retries", type=int, help="Number of times the suites with a regression are measured again, before the comparison fails. The new measurement replaces the old one as a whole. Default is 2.", default=2)
+    parser.add_argument("--min_delta", type=float, help="Only fail, if a time metric is also worse by more than this many seconds, so that the noise of sub-second metrics does not fail the comparison. Default is 0.05.", default=0.05)
+    args = parser.parse_args()
+
+    pdf_paths = getPdfPaths(args.path) if os.path.isdir(args.path) else [args.path]
+
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        suites = {'corpus': pdf_paths}
+        if args.stress_pages > 0:
+            suites['synthetic'] = synthetic_pdfs(tmp, args.stress_pages)
+        results = {suite: measure(paths, tmp, args) for suite, paths in suites.items()}
+
+        # a slow phase of the machine can exceed the thresholds -> measure the regressed suites again, before the comparison fails
+        for _ in range(args.retries if baseline is not None else 0):
+            results['peak_rss'] = peak_rss()
+            regressed = {x.split(' ')[0] for x in compare(results, baseline, args.max_regression, args.min_delta, verbose=False)} & set(suites)
+            if len(regressed) == 0: break
+            for suite in regressed:
+                results[suite] = measure(suites[suite], tmp, args)
+    results['peak_rss'] = peak_rss()
+
+    for suite in ['corpus', 'synthetic']:
+        if suite not in results: continue
+        r = results[suite]
+        print(f"{suite}:\t{r['pages']} pages\t{round(r['pages_per_s'], 2)} pages/s\tp50 {round(r['p50'], 3)} s\tp95 {round(r['p95'], 3)} s\tp99 {round(r['p99'], 3)} s")
+        print(f"\tdetection {round(r['detection'], 2)} s\tlayout {round(r['layout'], 2)} s\texport {round(r['export'], 2)} s")
+    print(f"Peak RSS:\t{round(results['peak_rss'], 1)} MB")
+
+    if args.save is not None:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=4)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.max_regression, args.min_delta)
+        if len(regressions) > 0:
+            print(f"Regression of more than {args.max_regression}% and {args.min_delta} s in: {', '.join(regressions)}")
+            sys.exit(1)
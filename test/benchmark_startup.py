@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+import __init__
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+def child(args):
+    """
+    Import the package, load the models of the mode and extract the first page in a fresh process. Prints the timings as json.
+    """
+    start = time.perf_counter()
+    from src.table_extractor import TableExtractor
+    from src.memory import peak_rss
+    from src.models import load_model
+    imported = time.perf_counter()
+
+    model = image_processor = structure_model = structure_image_processor = None
+    if args.mode == 'model-based':
+        model, image_processor = load_model(args.detection_model)
+        structure_model, structure_image_processor = load_model(args.structure_model)
+    loaded = time.perf_counter()
+
+    with TableExtractor(path=args.path, detection_method=args.mode, layout_method=args.mode, model=model, image_processor=image_processor, layout_model=structure_model, layout_processor=structure_image_processor) as te:
+        te.extractTablesInPage(0)
+    extracted = time.perf_counter()
+
+    print(json.dumps({'import': imported - start, 'models': loaded - imported, 'first_page': extracted - loaded, 'peak_rss': peak_rss(),
+                      'torch_imported': 'torch' in sys.modules, 'transformers_imported': 'transformers' in sys.modules}))
+
+def measure(mode, args):
+    """
+    Start the child process several times and keep the fastest run.
+
+    Returns:
+        dict: The process wall time (including the interpreter startup), the import time, the model loading time, the time of the first page and the peak memory.
+    """
+    runs = []
+    for _ in range(args.repeat):
+        command = [sys.executable, os.path.abspath(__file__), args.path, '--child', '--mode', mode, '--detection_model', args.detection_model, '--structure_model', args.structure_model]
+        s0 = time.perf_counter()
+        process = subprocess.run(command, capture_output=True, text=True)
+        wall = time.perf_counter() - s0
+        if process.returncode != 0:
+            print(f"{mode}: the child process failed\n{process.stderr.strip().splitlines()[-1] if process.stderr.strip() else ''}")
+            return None
+        runs.append({'wall': wall, **json.loads(process.stdout.strip().splitlines()[-1])})
+    return min(runs, key=lambda e: e['wall'])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure the startup time and memory of a fresh process for the rule-based and the model-based mode.")
+    parser.add_argument("path", nargs="?", help="Path to a pdf file, whose first page is extracted.", default="examples/pdf/FDX/2017/page_26.pdf")
+    parser.add_argument("--modes", nargs="+", choices=["rule-based", "model-based"], default=["rule-based", "model-based"])
+    parser.add_argument("--repeat", type=int, help="Number of fresh processes per mode. The fastest one is reported. Default is 3.", default=3)
+    parser.add_argument("--detection_model", help="Name or directory of the detection model.", default="microsoft/table-transformer-detection")
+    parser.add_argument("--structure_model", help="Name or directory of the structure recognition model.", default="microsoft/table-transformer-structure-recognition")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--mode", default="rule-based", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        sys.exit(0)
+
+    for mode in args.modes:
+        r = measure(mode, args)
+        if r is None: continue
+        print(f"{mode}:\twall {round(r['wall'], 2)} s\timport {round(r['import'], 2)} s\tmodels {round(r['models'], 2)} s\tfirst page {round(r['first_page'], 2)} s\tpeak RSS {round(r['peak_rss'], 1)} MB\ttorch imported {r['torch_imported']}\ttransformers imported {r['transformers_imported']}")
@@ -2,6 +2,7 @@
 import time
 import __init__
 from src.table_extractor import TableExtractor
+from src.models import load_model, DETECTION_MODEL, STRUCTURE_MODEL, OPTIMIZATIONS
 
 from difflib import SequenceMatcher
 
@@ -9,13 +10,12 @@ import numpy as np
 import os
 import json
 import concurrent.futures
+import argparse
 from threading import Thread
 from queue import Queue
 import time
 import shutil
 
-from transformers import AutoImageProcessor, TableTransformerForObjectDetection
-
 def getPdfPaths(path):
     pdfs = []
     for root, dirs, files in os.walk(path):
@@ -91,13 +91,13 @@ def calculate_iou(box1, box2):
     iou = intersection_area / (box1_area + box2_area - intersection_area)
     return iou
 
-def proc(dataset_path, pdf_path, test_tables, draw, tol, detection_method, layout_method, model=None, image_processor=None, structure_model=None, structure_image_processor=None):
+def proc(dataset_path, pdf_path, test_tables, draw, tol, detection_method, layout_method, model=None, image_processor=None, structure_model=None, structure_image_processor=None, render_policy='fixed'):
     match_list = []
     mismatch_list = []
     cell_match_list = []
     total_found_tables = 0
 
-    tableExtractor = TableExtractor(path=f"{dataset_path}/pdf/{pdf_path}", separate_units=False, detection_method=detection_method, layout_method=layout_method, model=model, image_processor=image_processor, layout_model=structure_model, layout_processor=structure_image_processor, max_column_space=4, max_row_space=-0.3)
+    tableExtractor = TableExtractor(path=f"{dataset_path}/pdf/{pdf_path}", separate_units=False, detection_method=detection_method, layout_method=layout_method, model=model, image_processor=image_processor, layout_model=structure_model, layout_processor=structure_image_processor, max_column_space=4, max_row_space=-0.3, render_policy=render_policy)
     try: tables = tableExtractor.extractTables(page_index=0) # all pdfs contain only one page
     except Exception as e: print(f"Error in {pdf_path}: {e}");return [0,0,0,0,0,0]
     page = tableExtractor.pages[0]
@@ -165,18 +165,16 @@ def proc(dataset_path, pdf_path, test_tables, draw, tol, detection_method, layou
     tableExtractor = None
     return [len(match_list), len(mismatch_list), len(cell_match_list), total_found_tables, f1_all, not_found]
 
-def test_parallel(pdf_paths, annotated_tables, draw='cell_match', tol=5, detection_method='rule-based', layout_method='rule-based', thread_number=1):
+def test_parallel(pdf_paths, annotated_tables, draw='cell_match', tol=5, detection_method='rule-based', layout_method='rule-based', thread_number=1, render_policy='fixed', optimize=None):
     model = None
     image_processor = None
     structure_model = None
     structure_image_processor = None
 
     if detection_method == 'model-based':
-        image_processor = AutoImageProcessor.from_pretrained("microsoft/table-transformer-detection")
-        model = TableTransformerForObjectDetection.from_pretrained("microsoft/table-transformer-detection")
+        model, image_processor = load_model(DETECTION_MODEL, optimize)
     if layout_method == 'model-based':
-        structure_image_processor = AutoImageProcessor.from_pretrained("microsoft/table-transformer-structure-recognition")
-        structure_model = TableTransformerForObjectDetection.from_pretrained("microsoft/table-transformer-structure-recognition")    
+        structure_model, structure_image_processor = load_model(STRUCTURE_MODEL, optimize)
     
     i = 0
 
@@ -196,7 +194,7 @@ def test_parallel(pdf_paths, annotated_tables, draw='cell_match', tol=5, detecti
                 continue
 
             if detection_method == 'rule-based': results.append(executor.submit(proc, dataset_path, pdf_path, annotated_tables[i]['tables'], draw, tol, detection_method, layout_method))
-            else: results.append(proc(dataset_path, pdf_path, annotated_tables[i]['tables'], draw, tol, detection_method, layout_method, model, image_processor, structure_model, structure_image_processor))
+            else: results.append(proc(dataset_path, pdf_path, annotated_tables[i]['tables'], draw, tol, detection_method, layout_method, model, image_processor, structure_model, structure_image_processor, render_policy))
             i+=1
         
         total_matches = 0
@@ -229,6 +227,13 @@ def loading_sequence(queue):
             break
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Evaluate the table extraction on fintabnet.")
+    parser.add_argument("--render_policies", type=lambda e: e.split(','), help="Comma separated render policies to compare, e.g. fixed,model. Only used with a model-based method. Default is fixed.", default=['fixed'])
+    parser.add_argument("--optimizations", type=lambda e: [None if x == 'none' else x for x in e.split(',')], help=f"Comma separated model variants to compare with 'none' for the original models, e.g. none,int8 (choices: none, {', '.join(OPTIMIZATIONS)}). Only used with a model-based method. Default is none.", default=[None])
+    args = parser.parse_args()
+    if any(x not in [None, *OPTIMIZATIONS] for x in args.optimizations): parser.error(f"unknown optimization in {args.optimizations}")
+    if any(x not in ['fixed', 'model'] for x in args.render_policies): parser.error(f"unknown render policy in {args.render_policies}")
+
     s0 = time.time()
 
     # Start the loading sequence in a separate process
@@ -256,31 +261,54 @@ if __name__ == '__main__':
     os.mkdir("img")
 
     tol = 30
-    
-    total_matches, total_mismatches, total_cell_matches, total_found_tables, f1, not_found_all = test_parallel(pdf_paths, annotated_tables, draw='cell_match', tol=tol, detection_method=detection_method, layout_method=layout_method, thread_number=thread_number)
 
-    q.put(True)
+    # the render policies and the CPU-optimized variants of the models (see src/models.py) are only compared if a model is involved
+    render_policies = args.render_policies if detection_method == 'model-based' or layout_method == 'model-based' else ['fixed']
+    optimizations = args.optimizations if detection_method == 'model-based' or layout_method == 'model-based' else [None]
+    policy_results = []
 
-    loading_thread.join()
+    for render_policy in render_policies:
+        for optimize in optimizations:
+            p0 = time.time()
+            total_matches, total_mismatches, total_cell_matches, total_found_tables, f1, not_found_all = test_parallel(pdf_paths, annotated_tables, draw='cell_match', tol=tol, detection_method=detection_method, layout_method=layout_method, thread_number=thread_number, render_policy=render_policy, optimize=optimize)
+            policy_results.append((render_policy, optimize, total_matches, total_cell_matches, total_found_tables, f1, not_found_all, time.time()-p0))
 
-    precision = total_matches / total_found_tables
-    recall = total_matches / total
-    cell_precision = total_cell_matches / total_found_tables
-    cell_recall = total_cell_matches / total
-
-    print(f"Number of tables found: {total_found_tables}/{total}")
-    print(f"Precision (Number of matches / Number of found tables):\t{total_matches}/{total_found_tables}\t{round(precision*100, 2)} %")
-    print(f"Recall (Number of matches / Number of expected tables):\t{total_matches}/{total}\t{round(recall*100, 2)} %")
-    print(f"F1-Score:\t{round((2*precision*recall)/(precision+recall), 3)}\n")
-
-    print(f"Cell Precision (Number of tables with correct cells / Number of found Tables):\t{total_cell_matches}/{total_found_tables}\t{round(cell_precision*100, 2)} %")
-    print(f"Cell Recall (Number of tables with correct cells / Number of expected tables):\t{total_cell_matches}/{total}\t{round(cell_recall*100, 2)} %")
-    print(f"Cell F1-Score:\t{round((2*cell_precision*cell_recall)/(cell_precision+cell_recall), 3)}")
-    print(f"Mean Cell F1-Score:\t{round(f1/total_matches, 3)}\n")
+    q.put(True)
 
-    print(f"Number of tables with correct cells / Number of correct tables:\t{total_cell_matches}/{total_matches}\t{round(total_cell_matches/total_matches*100, 2)} %")
+    loading_thread.join()
 
-    print(f"Potential missing tables in fintabnet: {not_found_all}/{total_found_tables}")
+    scores = {}
+    for render_policy, optimize, total_matches, total_cell_matches, total_found_tables, f1, not_found_all, duration in policy_results:
+        precision = total_matches / total_found_tables
+        recall = total_matches / total
+        cell_precision = total_cell_matches / total_found_tables
+        cell_recall = total_cell_matches / total
+        scores[(render_policy, optimize)] = {'F1-Score': (2*precision*recall)/(precision+recall), 'Cell F1-Score': (2*cell_precision*cell_recall)/(cell_precision+cell_recall), 'Mean Cell F1-Score': f1/total_matches, 'time': duration}
+
+        if len(render_policies) > 1: print(f"Render policy: {render_policy}\n")
+        if len(optimizations) > 1: print(f"Optimization: {optimize if optimize is not None else 'none'}\n")
+
+        print(f"Number of tables found: {total_found_tables}/{total}")
+        print(f"Precision (Number of matches / Number of found tables):\t{total_matches}/{total_found_tables}\t{round(precision*100, 2)} %")
+        print(f"Recall (Number of matches / Number of expected tables):\t{total_matches}/{total}\t{round(recall*100, 2)} %")
+        print(f"F1-Score:\t{round((2*precision*recall)/(precision+recall), 3)}\n")
+
+        print(f"Cell Precision (Number of tables with correct cells / Number of found Tables):\t{total_cell_matches}/{total_found_tables}\t{round(cell_precision*100, 2)} %")
+        print(f"Cell Recall (Number of tables with correct cells / Number of expected tables):\t{total_cell_matches}/{total}\t{round(cell_recall*100, 2)} %")
+        print(f"Cell F1-Score:\t{round((2*cell_precision*cell_recall)/(cell_precision+cell_recall), 3)}")
+        print(f"Mean Cell F1-Score:\t{round(f1/total_matches, 3)}\n")
+
+        print(f"Number of tables with correct cells / Number of correct tables:\t{total_cell_matches}/{total_matches}\t{round(total_cell_matches/total_matches*100, 2)} %")
+
+        print(f"Potential missing tables in fintabnet: {not_found_all}/{total_found_tables}")
+        print(f"Time: {int(duration / 60)}:{int(duration) % 60} minutes ({round(len(annotated_tables)/duration, 2)} pdfs/s)\n")
+
+    # accuracy delta and speedup of the optimized models compared to the original ones
+    for (render_policy, optimize), score in scores.items():
+        if optimize is None or (render_policy, None) not in scores: continue
+        reference = scores[(render_policy, None)]
+        deltas = '\t'.join(f"{metric} {round(score[metric] - reference[metric], 4):+}" for metric in ['F1-Score', 'Cell F1-Score', 'Mean Cell F1-Score'])
+        print(f"{optimize} ({render_policy}):\t{deltas}\tspeedup {round(reference['time'] / score['time'], 2)}x")
 
     s1 = time.time()
     print(f"{int((s1-s0) / 60)}:{int(s1-s0) % 60} minutes")
\ No newline at end of file